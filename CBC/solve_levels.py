@@ -3,6 +3,9 @@ import os
 import random
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import agent.sokoban_solver as sokoban_solver
+from utils.suite_benchmark import run_suite, write_rows, benchmark_path
+from utils.scheduler import schedule, schedule_path, write_rows as write_schedule
+from utils.resources import git_commit
 import argparse
 
 random.seed(0)
@@ -14,6 +17,14 @@ parser.add_argument('--verbose', type=int, default=0, help='0 for no output, num
 
 parser.add_argument('--mode', type=str, default="schoko", help='schoko for using schokoban, vanilla for using vanilla mcts')
 
+parser.add_argument('--levels', type=str, default=None, help='levels to solve, e.g. 1-20 or 1,4,7, all levels if not given')
+parser.add_argument('--benchmark', action='store_true', help='solve every level in its own process and record time, throughput and memory')
+parser.add_argument('--label', type=str, default=None, help='label of the benchmark file, the current commit if not given')
+parser.add_argument('--schedule', action='store_true', help='start every level with --initial_iters and search the unsolved levels again with growing budgets up to --num_iters')
+parser.add_argument('--initial_iters', type=int, default=100, help='schedule: budget of the first round')
+parser.add_argument('--eta', type=int, default=4, help='schedule: factor between the budgets of two rounds')
+parser.add_argument('--cpu_limit', type=float, default=None, help='schedule: total CPU seconds, no new searches are started afterwards')
+parser.add_argument('--workers', type=int, default=1, help='schedule: number of levels searched at the same time')
 args = parser.parse_args()
 
 folder_path = 'CBC/'
@@ -21,16 +32,49 @@ files = os.listdir(folder_path)
 level_files = [file for file in files if file.startswith('level')]
 NUM_LEVELS = len(level_files)
 
-outcomes = [None for _ in range(NUM_LEVELS)]
+if args.levels is None:
+    level_ids = list(range(1, NUM_LEVELS+1))
+else:
+    level_ids = []
+    for part in args.levels.split(","):
+        first, _, last = part.partition("-")
+        level_ids += list(range(int(first), int(last or first)+1))
 
-for level_id in range(NUM_LEVELS):
+if args.benchmark:
+    label = args.label or git_commit() or "local"
+    rows = []
+    for row in run_suite(folder_path, level_ids, args.mode, args.num_iters, label=label):
+        rows.append(row)
+        print(f"Level {row['level_id']}: {row['outcome']}, {row['time']:.2f}s, {row['iterations']} iterations, {row['peak_rss_mb']:.0f} MB.")
+    path = benchmark_path(folder_path, args.mode, args.num_iters, label)
+    write_rows(path, rows)
+    print(f"Solved {sum(row['outcome'] == 'WIN' for row in rows)} out of {len(rows)} levels, results written to {path}.")
+    sys.exit(0)
+
+if args.schedule:
+    label = args.label or git_commit() or "local"
+    rows = []
+    for row in schedule(folder_path, level_ids, args.mode, initial=args.initial_iters, eta=args.eta, max_budget=args.num_iters,
+                        cpu_limit=args.cpu_limit, workers=args.workers, verbose=1):
+        rows.append(row)
+        if row["outcome"] == "WIN":
+            print(f"Level {row['level_id']}: WIN, Solution Length: {row['length']}, budget {row['budget']}, {row['cpu_time']:.1f} CPU seconds.")
+    path = schedule_path(folder_path, args.mode, label)
+    write_schedule(path, rows)
+    print(f"Solved {sum(row['outcome'] == 'WIN' for row in rows)} out of {len(rows)} levels in {sum(row['cpu_time'] for row in rows):.1f} CPU seconds, "
+          f"results written to {path}.")
+    sys.exit(0)
+
+outcomes = [None for _ in level_ids]
+
+for i, level_id in enumerate(level_ids):
     solver = sokoban_solver.Solver()
-    outcome, length = solver.solve(level_id+1, folder_path, args.num_iters, args.verbose, args.mode)
+    outcome, length = solver.solve(level_id, folder_path, args.num_iters, args.verbose, args.mode)
     print("                                                                            ", end="\r")
     if outcome == "WIN":
-        print(f"Level {level_id+1}: {outcome}, Solution Length: {length}.")
+        print(f"Level {level_id}: {outcome}, Solution Length: {length}.")
     else:
-        print(f"Level {level_id+1}: {outcome}.")
-    outcomes[level_id] = 1 if outcome == "WIN" else 0
+        print(f"Level {level_id}: {outcome}.")
+    outcomes[i] = 1 if outcome == "WIN" else 0
 
-print(f"Soleved {sum(outcomes)} out of {NUM_LEVELS} levels.")
\ No newline at end of file
+print(f"Soleved {sum(outcomes)} out of {len(level_ids)} levels.")
\ No newline at end of file
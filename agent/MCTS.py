@@ -3,17 +3,54 @@ import math
 from queue import Queue
 import random
 
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from game.reward import Reward
+from game.GameElements import Elements
+from game.zobrist import state_key
 
 # constant balancing exploration and exploitation
 C_PUT = 8
 
+# reward types are stored as small integers in checkpoints
+REWARD_TYPES = ["STEP", "WIN", "LOSS"]
+# marks rewards of nodes that have not been evaluated yet in checkpoints
+UNEVALUATED = 255
+# progressive widening admits ceil(widening * n ** WIDENING_EXPONENT) children of a node visited n times
+WIDENING_EXPONENT = 0.5
+
+# square the box moved by the push leading to a node ends on, with macros (see game.macros) the push may be followed by
+# forced pushes of the same box, so the square is the one box square of the node that is not a box square of its parent
+def pushed_box(node):
+    player_x, player_y, dx, dy = node.move
+    if node.state.macros is None:
+        return (player_x + 2*dx, player_y + 2*dy)
+    moved = set(node.state.box_positions) - set(node.parent.state.box_positions)
+    return moved.pop() if moved else (player_x + 2*dx, player_y + 2*dy)
+
+# cheap score of the push leading to a node, used as prior for move ordering: +1 for pushing a box onto a goal, -1 for
+# pushing it off a goal, +0.5 for pushing the same box as the previous push and the decrease of the distance of the box
+# to the closest goal, the box is scored where it ends after the forced pushes of a macro
+def push_prior(node):
+    player_x, player_y, dx, dy = node.move
+    box = (player_x + dx, player_y + dy)
+    new_box = pushed_box(node)
+    parent = node.parent
+    score = 0.0
+    if node.state.level[new_box] == Elements.BOX_ON_GOAL.value:
+        score += 1
+    if parent.state.level[box] == Elements.BOX_ON_GOAL.value:
+        score -= 1
+    if parent.move is not None and pushed_box(parent) == box:
+        score += 0.5
+    distance = lambda square: min(abs(square[0] - x) + abs(square[1] - y) for x, y in node.tree.goals)
+    return score + distance(box) - distance(new_box)
+
 class Node():
-    def __init__(self, parent, state, move, depth):
-        # depth of the node in the Monte Carlo Search Tree (MCST)
-        self.depth = depth
+    def __init__(self, parent, state, move, tree, reward=None):
+        # search tree the node belongs to
+        self.tree = tree
+        # cached depth of the node in the Monte Carlo Search Tree (MCST), valid as long as no subtree was moved since
+        self._depth = 0
+        self._epoch = -1
         # board state represented by the node
         self.state = state
         # parent node
@@ -22,14 +59,59 @@ class Node():
         self.move = move
         # node children
         self.children = {}
-        # average over all rollouts that passed through the node (value of the node)
+        # average over all rollouts that passed through the edge from the parent to the node (value of the node)
         self.q = 0
-        # number of rollouts that passed through the node (visit count)
+        # number of rollouts that passed through the edge from the parent to the node (visit count)
+        # the statistics stay with the node when it is moved to a new parent, the ancestors are not updated
         self.n = 0
-        # reward associated with the state the node represents
-        self.reward = self.state.reward()
+        # reward associated with the state the node represents, only evaluated once the node is selected or rolled out
+        self._reward = reward
         # maximum reward of the node's and descendants, used for extracting the solution
-        self.max_value = self.reward
+        self._max_value = None
+        # score of the push leading to the node (see push_prior), computed when needed
+        self._prior_score = None
+        # prior probability of the node among its siblings, set during selection if priors are used
+        self.prior = 0
+    
+    # depth of the node, recomputed lazily from the closest ancestor with a valid cached depth after a subtree was moved
+    @property
+    def depth(self):
+        epoch = self.tree.epoch
+        if self._epoch == epoch:
+            return self._depth
+        path = []
+        node = self
+        while node is not None and node._epoch != epoch:
+            path.append(node)
+            node = node.parent
+        depth = -1 if node is None else node._depth
+        for node in reversed(path):
+            depth += 1
+            node._depth = depth
+            node._epoch = epoch
+        return self._depth
+    
+    # lazily evaluates the reward, most children are never selected and don't need to be evaluated
+    @property
+    def reward(self):
+        if self._reward is None:
+            self._reward = self.state.reward()
+        return self._reward
+    
+    # checks if the reward of the node has already been computed
+    @property
+    def evaluated(self):
+        return self._reward is not None
+    
+    @property
+    def max_value(self):
+        if self._max_value is None:
+            return self.reward
+        return self._max_value
+    
+    @max_value.setter
+    def max_value(self, max_value):
+        self._max_value = max_value
         
     @property
     def u(self):
@@ -38,9 +120,17 @@ class Node():
         # exploration term in the UCT formula
         return C_PUT * np.sqrt(2*np.log(self.parent.n)) / (self.n)
     
-    # returns UCT score
+    @property
+    def prior_score(self):
+        if self._prior_score is None:
+            self._prior_score = push_prior(self)
+        return self._prior_score
+    
+    # returns UCT score, with priors a PUCT style term favours children with a high prior probability
     @property
     def score(self):
+        if self.prior:
+            return self.q + self.u + self.tree.prior_weight * self.prior * np.sqrt(self.parent.n) / (1 + self.n)
         return self.q + self.u
    
     # recursively update the value of a node the value obtained from the last rollout 
@@ -52,108 +142,80 @@ class Node():
         if self.parent:
             self.parent.update(value, max_value) 
     
-    # recursively update the depth of a node
-    def update_depth(self, depth):
-        self.depth = depth
-        self.state.steps = depth
-        for child in self.children.values():
-            child.update_depth(depth+1)
-    
-    # after moving a subtree to a new parent, recursively update the new parent and its ancestors
-    def upgrade(self, n, value):
-        self.n += n
-        self.q = (self.q * (self.n-n) + value*n) / (self.n)
-        if len(self.children) != 0:
-            max_values = [child.max_value.get_value() for child in self.children.values()]
-            best_value = max(max_values)
-            for child in self.children.values():
-                if child.max_value.get_value() == best_value:
-                    child.max_value = child.max_value 
-        else:
-            self.max_value = self.reward
-        if self.parent:
-            self.parent.upgrade(n, value)
-    
-    # after moving a subtree to a new parent, recursively update the old parent and its ancestors
-    def downgrade(self, n, value):
-        self.n -= n
-        self.q = (self.q * (self.n+n) - value*n) / (self.n)
-        if len(self.children) != 0:
-            max_values = [child.max_value.get_value() for child in self.children.values()]
-            best_value = max(max_values)
-            for child in self.children.values():
-                if child.max_value.get_value() == best_value:
-                    child.max_value = child.max_value
-        else:
-            self.max_value = self.reward
-        if math.isnan(self.score):
-            print(self.q)
-            print(self.n)
-            print(self.state)
-            print("nan")
-            assert 0
-        
-        if self.parent:
-            self.parent.downgrade(n, value)
-           
-    # expands a node by adding its children to the tree, unnecessary children are removed, and the tree restructured if necessary
+    # propagates the maximum reward of a subtree that was moved to this node up the tree, stops as soon as an ancestor is not improved
+    def propagate_max_value(self, max_value):
+        node = self
+        while node is not None and node.max_value.get_value() < max_value.get_value():
+            node.max_value = max_value
+            node = node.parent
+    
+    # expands a node by adding its children to the tree, the tree is restructured if necessary
+    # children are added as unevaluated stubs, losses are removed once they are selected or rolled out
     def expand_node(self, valid_moves, mcts):
-        for move in valid_moves:
-            new_state = self.state.move(*move)
+        # all child states are generated in one batched pass
+        mcts.generated += len(valid_moves)
+        for move, new_state in zip(valid_moves, self.state.successors(valid_moves)):
             new_hash = new_state.hash
-            # child has not yet been added to the tree
-            if not (new_hash in mcts.del_nodes or new_hash in mcts.nodes):
-                child_node = Node(state=new_state, parent=self, move=move, depth=self.depth+1)
+            if new_hash in mcts.nodes:
+                # child has already been added to the tree at a lower depth, move its subtree to the current node
+                if self.depth+1 < mcts.nodes[new_hash].depth:
+                    self.adopt(mcts.nodes[new_hash], move, mcts)
+            # child has not yet been added to the tree and was not deleted from it
+            elif not state_key(new_state) in mcts.del_nodes:
+                child_node = Node(state=new_state, parent=self, move=move, tree=mcts)
                 self.children[move] = child_node
                 mcts.nodes[new_hash] = child_node
-            # child has already been added to the tree at a lower depth
-            elif new_hash in mcts.nodes and self.depth+1 < mcts.nodes[new_hash].depth:
-                self.children[move] = mcts.nodes[new_hash]
-                del mcts.nodes[new_hash].parent.children[mcts.nodes[new_hash].move]
-                # try to delete parent node if it has no children
-                n = mcts.nodes[new_hash].n
-                value = mcts.nodes[new_hash].q
-
-                N = mcts.root.n
-                V = mcts.root.q
-                # downgrade old parent
-                mcts.nodes[new_hash].parent.downgrade(n, value)
-                
-                if mcts.nodes[new_hash].parent.should_remove():
-                    mcts.nodes[new_hash].parent.remove(mcts)
-                
-                mcts.nodes[new_hash].parent = self
-                mcts.nodes[new_hash].move = move
-             
-                # recursively update the depth of the children
-                mcts.nodes[new_hash].update_depth(self.depth+1)
-
-                
-                # upgrade new parent
-                self.upgrade(n, value)
-                
-        # important that this is not done in one loop
-        for move in valid_moves:
-            if move in self.children: # could be that child caused cycle and thus was not added
-                if self.children[move].reward.get_type() == "LOSS" or self.children[move] in mcts.del_nodes:
-                    assert self.children[move].should_remove()
-                    self.children[move].remove(mcts)
+                mcts.created += 1
+                mcts.probe(child_node)
                     
         # it might be that during expansion no node was added, in this case delete the current node  
-        if self.should_remove() and (not self.state.hash in mcts.del_nodes):
+        if self.should_remove() and (not state_key(self.state) in mcts.del_nodes):
             self.remove(mcts)
         
+    # moves the subtree of a node already in the tree at a larger depth to this node
+    # only the two edges involved are touched, the statistics of the ancestors are left as they are
+    def adopt(self, child_node, move, mcts):
+        old_parent = child_node.parent
+        del old_parent.children[child_node.move]
+        self.children[move] = child_node
+        child_node.parent = self
+        child_node.move = move
+        child_node._prior_score = None
+        # invalidates all cached depths, they are recomputed lazily
+        mcts.epoch += 1
+        self.propagate_max_value(child_node.max_value)
+        
+        # try to delete old parent node if it has no children
+        if len(old_parent.children) == 0:
+            old_parent.max_value = old_parent.reward
+        if old_parent.should_remove():
+            old_parent.remove(mcts)
+        
     # selects the child node according to the UCT policy
+    # with progressive widening only the children with the highest priors are considered, more are admitted as the node is visited
     def select_child(self):
+        children = list(self.children.values())
+        tree = self.tree
+        if tree.prior_weight or tree.widening:
+            children.sort(key=lambda child: child.prior_score, reverse=True)
+            if tree.widening:
+                children = children[:max(1, math.ceil(tree.widening * self.n ** WIDENING_EXPONENT))]
+            # prior probabilities are the softmax of the prior scores
+            weights = [math.exp(child.prior_score - children[0].prior_score) for child in children]
+            total = sum(weights)
+            for child, weight in zip(children, weights):
+                child.prior = weight / total if tree.prior_weight else 0
         
-        # if there is a unvisited node, visit that node first
-        unvisited = [child for child in self.children.values() if child.n == 0]
+        # if there is a unvisited node, visit that node first, the one with the highest prior if priors are used
+        unvisited = [child for child in children if child.n == 0]
         if len(unvisited) > 0:
+            if tree.prior_weight or tree.widening:
+                unvisited = [child for child in unvisited if child.prior_score == unvisited[0].prior_score]
             return random.choice(unvisited)
        
         # otherwise select the child with the highest UCT score 
-        best_score = max(child.score for child in self.children.values())
-        best_children = [child for child in self.children.values() if child.score == best_score]
+        best_score = max(child.score for child in children)
+        best_children = [child for child in children if child.score == best_score]
             
         return random.choice(best_children) # break ties randomly
 
@@ -170,13 +232,32 @@ class Node():
     def rollout(self):
         return self.reward
     
+    # evaluates a node that is visited for the first time, losses are removed from the tree instead of being backpropagated
+    def simulate(self, mcts):
+        reward = self.rollout()
+        if reward.get_type() == "LOSS" and self.parent is not None:
+            self.remove(mcts)
+            return False
+        # backpropagate rollout value
+        self.update(reward.get_value(), reward)
+        return True
+    
+    # returns the moves leading from the root to the node
+    def path(self):
+        moves = []
+        node = self
+        while node.parent is not None:
+            moves.append(node.move)
+            node = node.parent
+        return moves[::-1]
+    
     # checks if the node should be removed from the tree
     def should_remove(self):
         return len(self.children) == 0 and not (self.max_value.get_type() == "WIN")
     
     # recursively removes the node from the tree
     def remove(self, mcts):
-        mcts.del_nodes.add(self.state.hash)
+        mcts.del_nodes.add(state_key(self.state))
         if self.state.hash == mcts.root.state.hash: # if the rot node is deleted, the level can't be solveds
             return
         del mcts.nodes[self.state.hash]
@@ -188,10 +269,134 @@ class Node():
                 parent.remove(mcts)
     
 class MCTS():
-    def __init__(self, sokobanboard):
-        self.root = Node(parent=None, state=sokobanboard, move=None, depth=0)
+    def __init__(self, sokobanboard, root=None, endgame=None, prior_weight=0, widening=0):
+        # incremented whenever a subtree is moved, invalidates the cached node depths
+        self.epoch = 0
+        self.root = Node(parent=None, state=sokobanboard, move=None, tree=self) if root is None else root
+        # zobrist keys of the deleted states (see game.zobrist)
         self.del_nodes = set()
         self.nodes = {self.root.state.hash: self.root}
+        # number of iterations the tree has been searched for, carried over when resuming from a checkpoint
+        self.iterations = 0
+        # children generated during expansion and the ones added to the tree, the others were transpositions of states
+        # already in the tree or deleted
+        self.generated = 0
+        self.created = 0
+        # endgame database (agent.endgame.EndgameTable) probed for every node added to the tree, the search stops at the first hit
+        self.endgame = endgame
+        self.endgame_node = None
+        self.endgame_tail = None
+        # weight of the prior term in the score of a node and coefficient of progressive widening, 0 to turn them off
+        self.prior_weight = prior_weight
+        self.widening = widening
+        self.goals = sokobanboard.find_elements([Elements.GOAL.value, Elements.BOX_ON_GOAL.value, Elements.PLAYER_ON_GOAL.value])
+        self.probe(self.root)
+    
+    # serializes the tree (node statistics, transposition keys, deleted states and rng state) to a compressed .npz checkpoint
+    def save(self, path):
+        # breadth first order guarantees that every parent is stored before its children
+        order = [self.root]
+        index = {id(self.root): 0}
+        for node in order:
+            for child in node.children.values():
+                index[id(child)] = len(order)
+                order.append(child)
+        
+        version, state, gauss = random.getstate()
+        np.savez_compressed(
+            path,
+            parent=np.array([-1 if node.parent is None else index[id(node.parent)] for node in order], dtype=np.int32),
+            move=np.array([(-1, -1, 0, 0) if node.move is None else node.move for node in order], dtype=np.int16),
+            n=np.array([node.n for node in order], dtype=np.int64),
+            q=np.array([node.q for node in order], dtype=np.float64),
+            reward=np.array([node._reward.get_value() if node.evaluated else 0 for node in order], dtype=np.float64),
+            reward_type=np.array([REWARD_TYPES.index(node._reward.get_type()) if node.evaluated else UNEVALUATED for node in order], dtype=np.uint8),
+            max_value=np.array([node._max_value.get_value() if node._max_value is not None else 0 for node in order], dtype=np.float64),
+            max_type=np.array([REWARD_TYPES.index(node._max_value.get_type()) if node._max_value is not None else UNEVALUATED for node in order], dtype=np.uint8),
+            keys=np.array([state_key(node.state) for node in order], dtype=np.int64),
+            del_nodes=np.array(sorted(self.del_nodes), dtype=np.int64),
+            iterations=np.array(self.iterations, dtype=np.int64),
+            rng_state=np.array(state, dtype=np.int64),
+            rng_version=np.array(version, dtype=np.int64),
+            rng_gauss=np.array(np.nan if gauss is None else gauss, dtype=np.float64),
+        )
+    
+    # restores a tree saved with save(), states are recomputed by replaying the stored moves from the given board
+    @classmethod
+    def load(cls, path, sokobanboard, restore_rng=True):
+        # every access to an array of the archive decompresses it again, so each array is read once
+        with np.load(path) as archive:
+            data = {key: archive[key] for key in archive.files}
+        keys = data["keys"]
+        assert keys[0] == state_key(sokobanboard), "checkpoint was created for a different level"
+        
+        nodes = []
+        for i in range(len(keys)):
+            reward = None
+            if data["reward_type"][i] != UNEVALUATED:
+                reward = Reward(float(data["reward"][i]), REWARD_TYPES[data["reward_type"][i]])
+            parent_index = data["parent"][i]
+            if parent_index == -1:
+                parent, move, state = None, None, sokobanboard
+            else:
+                parent = nodes[parent_index]
+                # board coordinates are numpy integers, keep the type so that the hashes of the recomputed states match
+                # the ones of the states generated by later expansions
+                move = tuple(np.int64(x) for x in data["move"][i])
+                state = parent.state.move(*move)
+                assert state_key(state) == keys[i], "checkpoint does not match the level"
+            node = Node(parent=parent, state=state, move=move, tree=None, reward=reward)
+            node.n = int(data["n"][i])
+            node.q = float(data["q"][i])
+            if data["max_type"][i] != UNEVALUATED:
+                node.max_value = Reward(float(data["max_value"][i]), REWARD_TYPES[data["max_type"][i]])
+            if parent is not None:
+                parent.children[move] = node
+            nodes.append(node)
+        
+        tree = cls(sokobanboard, root=nodes[0])
+        for node in nodes:
+            node.tree = tree
+        tree.nodes = {node.state.hash: node for node in nodes}
+        tree.del_nodes = set(data["del_nodes"].tolist())
+        tree.iterations = int(data["iterations"])
+        if restore_rng:
+            gauss = float(data["rng_gauss"])
+            random.setstate((int(data["rng_version"]), tuple(int(x) for x in data["rng_state"]), None if math.isnan(gauss) else gauss))
+        return tree
+    
+    # seeds the tree with a sequence of moves, e.g. the solution prefix of a previous run, by expanding and visiting every node along it
+    def warm_start(self, moves):
+        node = self.root
+        for move in moves:
+            move = tuple(move)
+            if node.reward.get_type() != "STEP":
+                break
+            if len(node.children) == 0:
+                self.expand(node)
+            if move not in node.children:
+                break
+            node = node.children[move]
+            if not node.simulate(self):
+                break
+        return node
+    
+    # returns the line of moves with the highest value found so far, used as a prefix for later runs
+    def best_line(self):
+        moves = []
+        node = self.root
+        while len(node.children) != 0:
+            move = node.select_move()
+            moves.append(move)
+            node = node.children[move]
+        return moves
+    
+    # remembers the first node whose state is in the endgame database and the moves solving it
+    def probe(self, node):
+        if self.endgame is not None and self.endgame_node is None:
+            self.endgame_tail = self.endgame.finish(node.state)
+            if self.endgame_tail is not None:
+                self.endgame_node = node
     
     # returns the leaf node selected during selection phase
     def select_leaf(self, node):
@@ -204,43 +409,53 @@ class MCTS():
         node.expand_node(node.state.valid_moves(), self)
                 
     # runs the MCTS algorithm for a given number of iterations
-    def run(self, iterations, verbose=0):
+    # profiler: context manager active during the search (see agent.profiling), the search code itself is not instrumented
+    # progress: utils.progress.Progress receiving the iterations, tree size and best value at its rate
+    def run(self, iterations, verbose=0, profiler=None, progress=None):
+        if profiler is not None:
+            with profiler:
+                return self.run(iterations, verbose=verbose, progress=progress)
+        root_key = state_key(self.root.state)
         for i in range(iterations):
-            if verbose:
-                print(f"Simulation {i+1}, {len(self.nodes)} nodes, {len(self.del_nodes)} deleted nodes", end="\r")
-            # selection phase
+            # the root is removed once every state reachable from it has been explored without finding a solution, the
+            # search stops instead of selecting the root again until the budget is spent
+            if root_key in self.del_nodes and len(self.root.children) == 0:
+                return None
+            self.iterations += 1
+            if progress is not None and self.iterations >= progress.next_iteration:
+                progress.update(self.iterations, nodes=len(self.nodes), deleted_nodes=len(self.del_nodes),
+                                best_value=self.root.max_value.get_value())
+            # selection phase, children are evaluated lazily so losses are only found here and removed before selecting again
             node = self.select_leaf(self.root)
+            while node.n == 0 and node.parent is not None and node.reward.get_type() == "LOSS":
+                node.remove(self)
+                node = self.select_leaf(self.root)
             # if all states have been explored and there is no solution, None will be returned during the selection phase
             if node is None:
                 return None
             # rollout
             if node.n == 0:
-                # random rollout
-                reward = node.rollout()
-                # backpropagate rollout value
-                node.update(reward.get_value(), reward)
+                node.simulate(self)
             # expansion phase
             else:
                 # expand node
                 self.expand(node)
-                # it might be that all children have already been removed from the tree again and the node removed, for example if the child was a loss
-                
-                if len(node.children):
-                # pick on chlid at random for simulation
-                    node = random.choice(list(node.children.values()))
-                    # rollout
-                    reward = node.rollout()
-                    # backpropagate rollout value
-                    node.update(reward.get_value(), reward)
-            if self.root.max_value.get_type() == "WIN":
+                # it might be that all children have already been removed from the tree again and the node removed
+                # pick one child at random for simulation, children that turn out to be losses are removed and another one is picked
+                while len(node.children):
+                    child = random.choice(list(node.children.values()))
+                    if child.simulate(self):
+                        break
+            if self.root.max_value.get_type() == "WIN" or self.endgame_node is not None:
                 break
+        if self.endgame_node is not None:
+            # the rest of the solution is read from the endgame database
+            return self.endgame_node.path() + self.endgame_tail
         if self.root.max_value.get_type() == "WIN":
-            moves = []
-            node = self.root
             # extract solution
-            while len(node.children) != 0:
-                move = node.select_move()
-                moves.append(move)
+            moves = self.best_line()
+            node = self.root
+            for move in moves:
                 node = node.children[move]
             assert node.reward.get_type() == "WIN"        
             return moves
\ No newline at end of file
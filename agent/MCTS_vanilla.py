@@ -3,9 +3,6 @@ from queue import Queue
 import random
 from copy import deepcopy
 
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import game.Sokoban as Sokoban
 
 # constant balancing exploration and exploitation
@@ -62,7 +59,13 @@ class Node():
                 child_node = Node(state=new_state, parent=self, move=move)
                 self.children[move] = child_node
                 hashes_copy.append(new_state.hash)
-                
+
+        # a node whose moves all lead back to states of the rollout is a dead end, it has to be removed here as valid_moves
+        # contains no dead pushes whose loss children would remove it
+        if self.should_remove():
+            self.remove()
+            return
+
         # important that this is not done in one loop
         for move in valid_moves:
             if move in self.children: # could be that child caused cycle and thus was not added
@@ -114,6 +117,8 @@ class Node():
 class MCTS():
     def __init__(self, sokobanboard):
         self.root = Node(parent=None, state=sokobanboard, move=None)
+        # number of iterations the tree has been searched for
+        self.iterations = 0
          
     # returns the leaf node selected during selection phase
     def select_leaf(self, node, hashes):
@@ -122,15 +127,27 @@ class MCTS():
             hashes.append(node.state.hash)
         return node
     
+    # number of nodes in the tree
+    def size(self):
+        size = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            size += 1
+            stack += node.children.values()
+        return size
+
     # expansion phase
     def expand(self, node, hashes):
         node.expand_node(node.state.valid_moves(), hashes)
                 
     # runs the MCTS algorithm for a given number of iterations
-    def run(self, iterations, verbose=0):
+    # progress: utils.progress.Progress receiving the iterations and best value at its rate
+    def run(self, iterations, verbose=0, progress=None):
         for i in range(iterations):
-            if verbose > 0:
-                print(f"Simulation: {i}", end="\r")
+            self.iterations += 1
+            if progress is not None and self.iterations >= progress.next_iteration:
+                progress.update(self.iterations, best_value=self.root.max_value.get_value())
             hashes = [self.root.state.hash]
             
             # selection phase
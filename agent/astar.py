@@ -0,0 +1,81 @@
+import heapq
+import itertools
+import time
+
+from agent.bfs import reconstruct
+from deadlock_detection.detect_deadlocks import check_deadlock
+from game.zobrist import state_key
+from reward_functions.heuristics import get_heuristic
+from utils.resources import peak_rss
+
+# (weighted) A* search over push moves
+# states are ordered by g + weight * h, g counts pushes, a macro move (see game.macros) costs the pushes it is made of
+# with weight 1 and an admissible heuristic the solution uses the minimal number of pushes, with macros the minimal number
+# among the solutions made of macro moves, which may be more than the minimal number of pushes of the level
+# larger weights trade solution length for speed
+# the open list is a binary heap, outdated entries are skipped when popped instead of being removed (lazy deletion)
+# endgame (an EndgameTable, optional) is probed for every new state, a state found in the table is finished from the table
+# right away, the solution is then no longer guaranteed to use the minimal number of pushes
+# num_iters limits the number of expanded states, stats (if given) is filled with search statistics
+def astar(board, num_iters, weight=1.0, heuristic="min_cost_matching", verbose=0, stats=None, endgame=None):
+    start = time.perf_counter()
+    h = get_heuristic(heuristic)
+    # ties are broken towards lower heuristic values, then first in first out
+    counter = itertools.count()
+    root = state_key(board)
+    parents = {root: (None, None)}
+    best_g = {root: 0}
+    closed = set()
+    h0 = h(board)
+    heap = [(weight * h0, h0, next(counter), 0, root, board)]
+    expanded = 0
+    generated = 0
+    pruned = 0
+    moves = None
+    if endgame is not None:
+        moves = endgame.finish(board)
+        if moves is not None:
+            heap = []
+
+    while heap and expanded < num_iters:
+        _, _, _, g, key, current_board = heapq.heappop(heap)
+        if key in closed or g > best_g[key]:
+            continue
+        if current_board.solved():
+            moves = reconstruct(parents, key)
+            break
+        closed.add(key)
+        expanded += 1
+        valid_moves = current_board.valid_moves()
+        for move, new_board in zip(valid_moves, current_board.successors(valid_moves)):
+            generated += 1
+            new_key = state_key(new_board)
+            # the forced pushes of a macro move are counted in the steps of the board
+            new_g = g + new_board.steps - current_board.steps
+            if new_key in closed or new_g >= best_g.get(new_key, float("inf")):
+                continue
+            if not new_board.solved() and check_deadlock(new_board):
+                pruned += 1
+                closed.add(new_key)
+                continue
+            best_g[new_key] = new_g
+            parents[new_key] = (key, move)
+            tail = None if endgame is None else endgame.finish(new_board)
+            if tail is not None:
+                moves = reconstruct(parents, new_key) + tail
+                break
+            new_h = h(new_board)
+            heapq.heappush(heap, (new_g + weight * new_h, new_h, next(counter), new_g, new_key, new_board))
+        if moves is not None:
+            break
+
+        if verbose >= 2 and expanded % 100 == 0:
+            print(f"Expanded: {expanded}, number of states: {len(best_g)}, open: {len(heap)}", end="\r")
+
+    if stats is not None:
+        elapsed = time.perf_counter() - start
+        stats.update(expanded=expanded, generated=generated, pruned=pruned, states=len(best_g), open=len(heap),
+                     states_per_sec=generated / elapsed if elapsed > 0 else 0.0, peak_rss_mb=peak_rss())
+        if endgame is not None:
+            stats.update(endgame_probes=endgame.probes, endgame_hits=endgame.hits)
+    return moves
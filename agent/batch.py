@@ -0,0 +1,111 @@
+import sys
+import json
+import time
+import random
+import argparse
+import multiprocessing as mp
+
+from agent.sokoban_solver import Solver
+from utils.solution_store import SolutionStore, to_json
+
+# solves many levels in one long-lived process (or a small pool of them), so the interpreter start-up, the imports and
+# the loading of the levels and their deadlock files are paid once instead of once per level as with demo.py
+# jobs are read one per line, a JSON object with "folder" and "level_id" and optionally "budget", "mode", "options" (the
+# engine options, see agent.engine), "engines" (of the portfolio), "seed" and "id", or "folder level_id [budget [mode]]"
+# separated by whitespace
+# the result of every job is written as a line of JSON as soon as it is done
+
+# solver of the current process, its board cache is kept across the jobs the process runs
+solver = None
+# solution store (see utils.solution_store) and its reuse, set before the jobs are run, every process opens the store itself
+store_path = None
+store_reuse = "solution"
+store_prefix = 0.5
+
+def parse_job(line, budget, mode):
+    if line.startswith("{"):
+        job = json.loads(line)
+    else:
+        fields = line.split()
+        job = {"folder": fields[0], "level_id": int(fields[1])}
+        if len(fields) > 2:
+            job["budget"] = int(fields[2])
+        if len(fields) > 3:
+            job["mode"] = fields[3]
+    return complete_job(job, budget, mode)
+
+# adds the default budget and engine to a job given as a dict
+def complete_job(job, budget, mode):
+    if not job["folder"].endswith("/"):
+        job["folder"] += "/"
+    job.setdefault("budget", budget)
+    job.setdefault("mode", mode)
+    return job
+
+# jobs of the given lines, empty lines and lines starting with # are skipped
+def read_jobs(lines, budget=1000, mode="schoko"):
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield parse_job(line, budget, mode)
+
+# solves a single job, the result is the job itself with the outcome, solution length, wall time and the statistics of
+# the engine, or with the error if the job failed
+def solve_job(number, job, moves=False):
+    global solver
+    if solver is None:
+        solver = Solver(store=SolutionStore(store_path) if store_path else None, reuse=store_reuse, prefix_fraction=store_prefix)
+    # every job is seeded, so its result does not depend on the jobs run before it in the same process
+    random.seed(job.get("seed", 0))
+    result = dict(job, job=number)
+    start = time.perf_counter()
+    try:
+        outcome, length = solver.solve(job["level_id"], job["folder"], job["budget"], 0, job["mode"], engines=job.get("engines"),
+                                       engine_options=job.get("options"))
+    except Exception as e:
+        result.update(outcome="ERROR", error=f"{type(e).__name__}: {e}", time=time.perf_counter() - start)
+        return result
+    result.update(outcome=outcome, length=length, time=time.perf_counter() - start, stats=solver.result.stats)
+    if moves and solver.result.moves is not None:
+        result["moves"] = [list(move) for move in solver.result.moves]
+    return result
+
+def solve_star(args):
+    return solve_job(*args)
+
+# solves the jobs and yields their results, in the order of the jobs for a single worker and as they finish otherwise
+def run_batch(jobs, workers=1, moves=False):
+    tasks = ((number, job, moves) for number, job in enumerate(jobs))
+    if workers <= 1:
+        for task in tasks:
+            yield solve_star(task)
+        return
+    with mp.Pool(workers) as pool:
+        yield from pool.imap_unordered(solve_star, tasks)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Solve a batch of levels in one process, one JSON result per line')
+    parser.add_argument('jobs', type=str, nargs='?', default=None, help='file with one job per line, stdin if not given')
+    parser.add_argument('--output', type=str, default=None, help='file the results are written to, stdout if not given')
+    parser.add_argument('--budget', type=int, default=1000, help='budget of the jobs that do not give one')
+    parser.add_argument('--mode', type=str, default="schoko", help='engine of the jobs that do not give one')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--moves', action='store_true', help='include the moves of the solutions in the results')
+    parser.add_argument('--store', type=str, default=None, help='solution store (SQLite) shared by the jobs')
+    parser.add_argument('--store_reuse', type=str, default="solution", help='solution: return stored solutions, prefix: warm start schoko with their beginning')
+    parser.add_argument('--store_prefix', type=float, default=0.5, help='with --store_reuse=prefix: fraction of the stored solutions used as prefix')
+    args = parser.parse_args()
+    store_path, store_reuse, store_prefix = args.store, args.store_reuse, args.store_prefix
+
+    source = open(args.jobs) if args.jobs else sys.stdin
+    output = open(args.output, "w") if args.output else sys.stdout
+    # anything the solver prints (e.g. the deadlock precomputation of custom levels) goes to stderr, stdout is JSONL only
+    sys.stdout = sys.stderr
+    start = time.perf_counter()
+    solved = total = 0
+    for result in run_batch(read_jobs(source, args.budget, args.mode), args.workers, args.moves):
+        output.write(json.dumps(result, default=to_json) + "\n")
+        output.flush()
+        total += 1
+        solved += result["outcome"] == "WIN"
+    print(f"Solved {solved} out of {total} jobs in {time.perf_counter() - start:.1f}s.", file=sys.stderr)
@@ -0,0 +1,68 @@
+import time
+from collections import deque
+
+from deadlock_detection.detect_deadlocks import check_deadlock
+from game.zobrist import state_key
+from utils.resources import peak_rss
+
+# follows the parent pointers from a state back to the start state and returns the moves in order
+def reconstruct(parents, key):
+    moves = []
+    parent, move = parents[key]
+    while move is not None:
+        moves.append(move)
+        key = parent
+        parent, move = parents[key]
+    return moves[::-1]
+
+# breadth first search over push moves, the solution found (if any) uses the minimal number of pushes, with macros (see
+# game.macros) the minimal number of macro moves instead
+# states are identified by their zobrist key, the closed set maps every key to its parent key and the move leading to it
+# endgame (an EndgameTable, optional) is probed for every new state, a state found in the table is finished from the table
+# right away, the solution is then no longer guaranteed to use the minimal number of pushes
+# num_iters limits the number of expanded states, stats (if given) is filled with search statistics
+def bfs(board, num_iters, verbose=0, stats=None, endgame=None):
+    start = time.perf_counter()
+    root = state_key(board)
+    parents = {root: (None, None)}
+    frontier = deque([board])
+    expanded = 0
+    generated = 0
+    moves = None
+
+    if board.solved():
+        moves = []
+    elif endgame is not None:
+        moves = endgame.finish(board)
+
+    while frontier and expanded < num_iters and moves is None:
+        current_board = frontier.popleft()
+        expanded += 1
+        current_key = state_key(current_board)
+        valid_moves = current_board.valid_moves()
+        for move, new_board in zip(valid_moves, current_board.successors(valid_moves)):
+            generated += 1
+            new_key = state_key(new_board)
+            if new_key in parents:
+                continue
+            parents[new_key] = (current_key, move)
+            if new_board.solved():
+                moves = reconstruct(parents, new_key)
+                break
+            tail = None if endgame is None else endgame.finish(new_board)
+            if tail is not None:
+                moves = reconstruct(parents, new_key) + tail
+                break
+            if not check_deadlock(new_board):
+                frontier.append(new_board)
+
+        if verbose >= 2 and expanded % 100 == 0:
+            print(f"Expanded: {expanded}, number of states: {len(parents)}, frontier: {len(frontier)}", end="\r")
+
+    if stats is not None:
+        elapsed = time.perf_counter() - start
+        stats.update(expanded=expanded, generated=generated, states=len(parents), frontier=len(frontier),
+                     states_per_sec=generated / elapsed if elapsed > 0 else 0.0, peak_rss_mb=peak_rss())
+        if endgame is not None:
+            stats.update(endgame_probes=endgame.probes, endgame_hits=endgame.hits)
+    return moves
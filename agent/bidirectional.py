@@ -0,0 +1,97 @@
+import time
+
+from deadlock_detection.detect_deadlocks import check_deadlock
+from game.GameElements import Elements
+from game.ReverseSokoban import ReverseSokobanBoard
+from game.zobrist import state_key
+from utils.resources import peak_rss
+
+# returns the solved positions of a level as reverse boards: all boxes on goals and the player in one of the connected
+# components of the remaining floor, there is one board per component
+def goal_states(level_id, folder):
+    board = ReverseSokobanBoard(level_id, folder=folder)
+    empty = board.level.copy()
+    empty[board.player] = Elements.FLOOR.value if empty[board.player] == Elements.PLAYER.value else Elements.GOAL.value
+    board.level = empty
+    boards = []
+    for component in board.find_components():
+        level = empty.copy()
+        player = component[0]
+        level[player] = Elements.PLAYER.value if level[player] == Elements.FLOOR.value else Elements.PLAYER_ON_GOAL.value
+        boards.append(board.construct(level, player, 0))
+    return boards
+
+# converts a pull (player_x, player_y, dx, dy) of a reverse board into the push that undoes it
+# after the pull the box is at (player_x, player_y) and the player at (player_x + dx, player_y + dy)
+def pull_to_push(player_x, player_y, dx, dy):
+    return (player_x + dx, player_y + dy, -dx, -dy)
+
+# follows the parent pointers of one side of the search back to its start states
+def path(parents, key):
+    moves = []
+    parent, move, _ = parents[key]
+    while move is not None:
+        moves.append(move)
+        key = parent
+        parent, move, _ = parents[key]
+    return moves[::-1]
+
+# bidirectional breadth first search: a forward push search from the start state and a backward pull search
+# from the solved positions (ReverseSokobanBoard) are grown layer by layer, always expanding the smaller frontier
+# both sides key states by their zobrist key, so a state generated by one side is found in the visited set of the other
+# the layer in which the sides meet is completed and the shortest connection is returned, so solutions use the
+# minimal number of pushes
+# num_iters limits the number of expanded states of both sides, stats (if given) is filled with search statistics
+def bidirectional(board, num_iters, verbose=0, stats=None):
+    start = time.perf_counter()
+    forward_key = state_key(board)
+    forward = {forward_key: (None, None, 0)}
+    forward_layer = [board]
+    backward_layer = goal_states(board.level_id, board.folder)
+    backward = {state_key(goal): (None, None, 0) for goal in backward_layer}
+    expanded = 0
+    generated = 0
+    meeting = forward_key if forward_key in backward else None
+
+    while meeting is None and forward_layer and backward_layer and expanded < num_iters:
+        is_forward = len(forward_layer) <= len(backward_layer)
+        layer, own, other = (forward_layer, forward, backward) if is_forward else (backward_layer, backward, forward)
+        next_layer = []
+        best = None
+        for current in layer:
+            expanded += 1
+            current_key = state_key(current)
+            depth = own[current_key][2] + 1
+            valid_moves = current.valid_moves()
+            children = current.successors(valid_moves) if is_forward else [current.move(*move) for move in valid_moves]
+            for move, child in zip(valid_moves, children):
+                generated += 1
+                key = state_key(child)
+                if key in own:
+                    continue
+                own[key] = (current_key, move, depth)
+                if key in other:
+                    if best is None or depth + other[key][2] < best[0]:
+                        best = (depth + other[key][2], key)
+                # dead states can only be reached from the start state, the backward search never generates them
+                elif not is_forward or not check_deadlock(child):
+                    next_layer.append(child)
+        if best is not None:
+            meeting = best[1]
+        if is_forward:
+            forward_layer = next_layer
+        else:
+            backward_layer = next_layer
+        if verbose >= 2:
+            print(f"Expanded: {expanded}, forward states: {len(forward)}, backward states: {len(backward)}", end="\r")
+
+    moves = None
+    if meeting is not None:
+        moves = path(forward, meeting) + [pull_to_push(*pull) for pull in path(backward, meeting)[::-1]]
+
+    if stats is not None:
+        elapsed = time.perf_counter() - start
+        stats.update(expanded=expanded, generated=generated, forward_states=len(forward), backward_states=len(backward),
+                     states=len(forward) + len(backward), states_per_sec=generated / elapsed if elapsed > 0 else 0.0,
+                     peak_rss_mb=peak_rss())
+    return moves
@@ -0,0 +1,137 @@
+import time
+import numpy as np
+import argparse
+
+import os
+from agent.bidirectional import goal_states
+from game.zobrist import state_key
+
+# marks empty slots of the table, distances are stored as uint8 so at most MAX_DEPTH pulls can be stored
+EMPTY = 255
+MAX_DEPTH = 254
+DTYPE = np.dtype([("key", np.int64), ("dist", np.uint8)])
+
+# default location of the table of a level, next to the precomputed deadlocks
+def endgame_path(level_id, folder):
+    return "endgame/" + folder + "level_" + str(level_id) + ".npy"
+
+# retrograde search: breadth first search with pull moves from the solved positions of the level
+# returns a dict mapping the zobrist key of every state within depth pulls of a solved position to its number of pushes
+# to go, as pulls are the inverse of pushes the pull distance is the minimal number of pushes to solve the state
+# max_states bounds the number of states, the last layer is then incomplete but all stored distances are exact
+def retrograde(level_id, folder, depth, max_states=None, verbose=0):
+    assert depth <= MAX_DEPTH, f"at most {MAX_DEPTH} pulls can be stored"
+    layer = goal_states(level_id, folder)
+    distances = {state_key(goal): 0 for goal in layer}
+    for d in range(1, depth + 1):
+        next_layer = []
+        for current in layer:
+            for move in current.valid_moves():
+                child = current.move(*move)
+                key = state_key(child)
+                if key in distances:
+                    continue
+                distances[key] = d
+                next_layer.append(child)
+                if max_states is not None and len(distances) >= max_states:
+                    return distances
+        if verbose >= 2:
+            print(f"Depth {d}: {len(next_layer)} states, {len(distances)} states in total", end="\r")
+        if not next_layer:
+            break
+        layer = next_layer
+    return distances
+
+# writes the distances as an open addressing hash table (linear probing, at most half full) to a .npy file
+# a slot is a (key, dist) record, the slot of a key is given by its lower bits
+def save_table(distances, path):
+    size = 1
+    while size < 2 * len(distances):
+        size *= 2
+    mask = size - 1
+    table = np.zeros(size, dtype=DTYPE)
+    table["dist"] = EMPTY
+    keys = table["key"]
+    dists = table["dist"]
+    for key, dist in distances.items():
+        index = key & mask
+        while dists[index] != EMPTY:
+            index = (index + 1) & mask
+        keys[index] = key
+        dists[index] = dist
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.save(path, table)
+
+# endgame database of a level, the table is memory mapped so processes probing the same file share its pages
+class EndgameTable():
+    def __init__(self, path):
+        self.path = path
+        table = np.load(path, mmap_mode="r")
+        self.keys = table["key"]
+        self.dists = table["dist"]
+        self.mask = len(table) - 1
+        self.probes = 0
+        self.hits = 0
+
+    # returns the number of pushes needed to solve the state with the given key, None if the state is not in the table
+    def probe(self, key):
+        self.probes += 1
+        index = key & self.mask
+        while self.dists[index] != EMPTY:
+            if self.keys[index] == key:
+                self.hits += 1
+                return int(self.dists[index])
+            index = (index + 1) & self.mask
+        return None
+
+    def distance(self, board):
+        return self.probe(state_key(board))
+
+    # returns the moves solving a board found in the table: a greedy descent to a child as many pushes closer to the goal
+    # as it took to reach it (one, or more for macro pushes, see game.macros), every stored state except the solved ones
+    # has a child one push closer, None if the board is not in the table or a macro leaves the optimal solutions
+    def finish(self, board):
+        distance = self.distance(board)
+        if distance is None:
+            return None
+        moves = []
+        while distance > 0:
+            valid_moves = board.valid_moves()
+            for move, child in zip(valid_moves, board.successors(valid_moves)):
+                pushes = child.steps - board.steps
+                if self.probe(state_key(child)) == distance - pushes:
+                    moves.append(move)
+                    board = child
+                    distance -= pushes
+                    break
+            else:
+                return None
+        return moves
+
+# builds the table of a level and saves it to path (endgame_path if None)
+def build_endgame(level_id, folder, depth, path=None, max_states=None, verbose=0):
+    start = time.perf_counter()
+    path = endgame_path(level_id, folder) if path is None else path
+    distances = retrograde(level_id, folder, depth, max_states=max_states, verbose=verbose)
+    save_table(distances, path)
+    if verbose:
+        print(f"Level {level_id}: {len(distances)} states within {max(distances.values())} pushes of the goal, "
+              f"{os.path.getsize(path)} bytes, {time.perf_counter() - start:.1f}s")
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Endgame database')
+    parser.add_argument('--folder', type=str, default="Microban/", help='foldername')
+    parser.add_argument('--level_id', type=int, default=-1, help='level id, if -1 then all levels are computed')
+    parser.add_argument('--depth', type=int, default=10, help='number of pulls from the solved positions')
+    parser.add_argument('--max_states', type=int, default=None, help='maximum number of states per level')
+    args = parser.parse_args()
+    files = os.listdir(args.folder)
+    level_files = [file for file in files if file.startswith('level')]
+    NUM_LEVELS = len(level_files)
+
+    level_ids = [args.level_id] if args.level_id != -1 else range(1, NUM_LEVELS+1)
+    for level_id in level_ids:
+        build_endgame(level_id, args.folder, args.depth, max_states=args.max_states, verbose=1)
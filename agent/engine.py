@@ -0,0 +1,290 @@
+import time
+
+import os
+from utils.progress import Progress, console
+
+# the search modules are imported by the engines using them, so creating an engine only loads what it needs
+
+# result of a search engine: the outcome ("WIN" or "LOSS"), the moves of the solution and search statistics
+class Result():
+    def __init__(self, outcome, moves=None, stats=None):
+        self.outcome = outcome
+        self.moves = moves
+        self.stats = {} if stats is None else stats
+
+    def __repr__(self):
+        return "Result( " + str(self.outcome) + ", length = " + str(self.length) + ", stats = " + str(self.stats) + ")"
+
+    @property
+    def length(self):
+        return None if self.moves is None else len(self.moves)
+
+# common interface of all search engines
+# solve(board, budget) searches from the given SokobanBoard and returns a Result, the meaning of the budget depends on the engine
+class Engine():
+    name = None
+    # engines supporting macro pushes (see game.macros) set these in their constructor
+    macros = False
+    goal_rooms = False
+    # engines supporting the solution post-optimizer (see agent.optimizer) set this in their constructor
+    optimize = False
+    # progress events of the search (utils.progress.Progress), set by the caller, MCTS engines report their iterations
+    progress = None
+
+    def __init__(self, verbose=0):
+        self.verbose = verbose
+
+    def solve(self, board, budget):
+        raise NotImplementedError
+
+    # wraps the moves found by a search into a Result, adds the engine name and the elapsed time to the statistics
+    def result(self, moves, start, stats):
+        stats["engine"] = self.name
+        stats["time"] = time.perf_counter() - start
+        return Result("LOSS" if moves is None else "WIN", moves, stats)
+
+    # returns the board the search is run on, a copy generating macro pushes if macros are enabled
+    def prepare(self, board):
+        if not self.macros:
+            return board
+        from game.macros import MacroLayer
+        search_board = board.copy()
+        search_board.macros = MacroLayer(board, goal_rooms=self.goal_rooms)
+        return search_board
+
+    # expands the moves found on a board returned by prepare() into single pushes from the given board
+    def expand(self, board, search_board, moves):
+        if moves is None or search_board.macros is None:
+            return moves
+        return search_board.macros.expand(board, moves)
+
+    # progress events of a search with the given budget, a status line on the console if none were requested and the
+    # engine is verbose
+    def reporter(self, budget):
+        if self.progress is None and self.verbose:
+            return Progress(console, interval=0.2, engine=self.name, budget=budget)
+        return self.progress
+
+    # shortens the moves found from the given board with the solution post-optimizer if it is enabled
+    def postprocess(self, board, moves, stats):
+        if moves is None or not self.optimize:
+            return moves
+        from agent.optimizer import optimize
+        return optimize(board, moves, verbose=self.verbose, stats=stats)
+
+# opens the endgame database at the given path (see agent.endgame), None if no path is given
+def open_endgame(path):
+    if path is None:
+        return None
+    from agent.endgame import EndgameTable
+    return EndgameTable(path)
+
+# Schokoban: MCTS with transposition handling, the budget is the total number of iterations
+class MCTSEngine(Engine):
+    name = "schoko"
+
+    # resume: checkpoint to continue from, checkpoint: path the tree is saved to, prefix: moves used to warm start the search
+    # endgame: path of an endgame database the nodes are probed against
+    # macros: collapse pushes through tunnels into one move, goal_rooms: also push boxes entering a goal room to their goal
+    # prior: weight of the PUCT style prior term, widening: coefficient of progressive widening, 0 turns them off
+    # optimize: shorten the solution found with the post-optimizer
+    # profile: file the phase times (JSON) or a cProfile trace (.prof, .pstats) of the search are written to
+    def __init__(self, verbose=0, resume=None, checkpoint=None, prefix=None, endgame=None, macros=False, goal_rooms=False,
+                 prior=0, widening=0, optimize=False, profile=None):
+        super().__init__(verbose)
+        self.resume = resume
+        self.checkpoint = checkpoint
+        self.prefix = prefix
+        self.endgame = endgame
+        self.macros = macros or goal_rooms
+        self.goal_rooms = goal_rooms
+        self.prior = prior
+        self.widening = widening
+        self.optimize = optimize
+        self.profile = profile
+
+    def solve(self, board, budget):
+        import agent.MCTS as MCTS
+        start = time.perf_counter()
+        search_board = self.prepare(board)
+        if self.resume is not None and os.path.isfile(self.resume):
+            tree = MCTS.MCTS.load(self.resume, search_board)
+        else:
+            tree = MCTS.MCTS(search_board)
+        tree.endgame = open_endgame(self.endgame)
+        tree.probe(tree.root)
+        tree.prior_weight = self.prior
+        tree.widening = self.widening
+        if self.prefix is not None:
+            tree.warm_start(self.prefix)
+        profiler = None
+        if self.profile is not None:
+            from agent.profiling import get_profiler
+            profiler = get_profiler(self.profile)
+        progress = self.reporter(budget)
+        moves = self.expand(board, search_board, tree.run(max(budget - tree.iterations, 0), verbose=self.verbose, profiler=profiler, progress=progress))
+        if self.checkpoint is not None:
+            tree.save(self.checkpoint)
+        stats = {"iterations": tree.iterations, "nodes": len(tree.nodes), "deleted_nodes": len(tree.del_nodes)}
+        stats.update(created=tree.created, generated=tree.generated, transpositions=tree.generated - tree.created)
+        if profiler is not None:
+            profiler.save(self.profile, tree)
+            if hasattr(profiler, "report"):
+                stats["profile"] = profiler.report(tree)
+                if self.verbose >= 2:
+                    profiler.print(tree)
+        if tree.endgame is not None:
+            stats.update(endgame_probes=tree.endgame.probes, endgame_hits=tree.endgame.hits)
+        moves = self.postprocess(board, moves, stats)
+        return self.result(moves, start, stats)
+
+# Vanillaban: plain MCTS without transposition handling, the budget is the number of iterations
+class VanillaEngine(Engine):
+    name = "vanilla"
+
+    def __init__(self, verbose=0, macros=False, goal_rooms=False, optimize=False):
+        super().__init__(verbose)
+        self.macros = macros or goal_rooms
+        self.goal_rooms = goal_rooms
+        self.optimize = optimize
+
+    def solve(self, board, budget):
+        import agent.MCTS_vanilla as MCTS_vanilla
+        start = time.perf_counter()
+        search_board = self.prepare(board)
+        tree = MCTS_vanilla.MCTS(search_board)
+        moves = self.expand(board, search_board, tree.run(budget, verbose=self.verbose, progress=self.reporter(budget)))
+        stats = {"iterations": tree.iterations, "nodes": tree.size()}
+        moves = self.postprocess(board, moves, stats)
+        return self.result(moves, start, stats)
+
+# breadth first search, the budget is the number of expanded states
+class BFSEngine(Engine):
+    name = "bfs"
+
+    def __init__(self, verbose=0, endgame=None, macros=False, goal_rooms=False):
+        super().__init__(verbose)
+        self.endgame = endgame
+        self.macros = macros or goal_rooms
+        self.goal_rooms = goal_rooms
+
+    def solve(self, board, budget):
+        from agent.bfs import bfs
+        start = time.perf_counter()
+        stats = {}
+        search_board = self.prepare(board)
+        moves = bfs(search_board, budget, verbose=self.verbose, stats=stats, endgame=open_endgame(self.endgame))
+        moves = self.expand(board, search_board, moves)
+        return self.result(moves, start, stats)
+
+# weighted A*, the budget is the number of expanded states
+# weight 1 gives solutions with the minimal number of pushes (without macros, see agent.astar), larger weights find
+# (longer) solutions faster
+class AStarEngine(Engine):
+    name = "astar"
+
+    def __init__(self, verbose=0, weight=1.0, heuristic="min_cost_matching", endgame=None, macros=False, goal_rooms=False):
+        super().__init__(verbose)
+        self.weight = weight
+        self.heuristic = heuristic
+        self.endgame = endgame
+        self.macros = macros or goal_rooms
+        self.goal_rooms = goal_rooms
+
+    def solve(self, board, budget):
+        from agent.astar import astar
+        start = time.perf_counter()
+        stats = {"weight": self.weight, "heuristic": self.heuristic}
+        search_board = self.prepare(board)
+        moves = astar(search_board, budget, weight=self.weight, heuristic=self.heuristic, verbose=self.verbose, stats=stats,
+                      endgame=open_endgame(self.endgame))
+        moves = self.expand(board, search_board, moves)
+        return self.result(moves, start, stats)
+
+# IDA* on a single board modified in place, the budget is the number of expanded states
+# memory use is bounded by the size of the transposition table (a power of two)
+class IDAStarEngine(Engine):
+    name = "idastar"
+
+    def __init__(self, verbose=0, heuristic="min_cost_matching", tt_size=2**20, endgame=None):
+        super().__init__(verbose)
+        self.heuristic = heuristic
+        self.tt_size = tt_size
+        self.endgame = endgame
+
+    def solve(self, board, budget):
+        from agent.idastar import idastar
+        start = time.perf_counter()
+        stats = {"heuristic": self.heuristic, "tt_size": self.tt_size}
+        moves = idastar(board, budget, heuristic=self.heuristic, tt_size=self.tt_size, verbose=self.verbose, stats=stats,
+                        endgame=open_endgame(self.endgame))
+        return self.result(moves, start, stats)
+
+# bidirectional breadth first search (forward pushes, backward pulls), the budget is the number of expanded states
+class BidirectionalEngine(Engine):
+    name = "bidirectional"
+
+    def solve(self, board, budget):
+        from agent.bidirectional import bidirectional
+        start = time.perf_counter()
+        stats = {}
+        moves = bidirectional(board, budget, verbose=self.verbose, stats=stats)
+        return self.result(moves, start, stats)
+
+# breadth first search with the frontier and visited set on disk, the budget is the number of states stored
+# workdir: directory for the on disk layers (a temporary directory if None), exhaustive: search the whole state space
+class ExternalBFSEngine(Engine):
+    name = "external"
+
+    def __init__(self, verbose=0, workdir=None, exhaustive=False, run_size=2**20):
+        super().__init__(verbose)
+        self.workdir = workdir
+        self.exhaustive = exhaustive
+        self.run_size = run_size
+
+    def solve(self, board, budget):
+        from agent.external_bfs import external_bfs
+        start = time.perf_counter()
+        stats = {}
+        moves = external_bfs(board, budget, workdir=self.workdir, exhaustive=self.exhaustive, run_size=self.run_size, verbose=self.verbose, stats=stats)
+        return self.result(moves, start, stats)
+
+# breadth first search with the states partitioned over several worker processes by their zobrist key, the budget is the
+# number of states stored across all workers
+class ParallelBFSEngine(Engine):
+    name = "parallel"
+
+    def __init__(self, verbose=0, num_workers=None, batch_size=256):
+        super().__init__(verbose)
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+
+    def solve(self, board, budget):
+        from agent.parallel_bfs import parallel_bfs
+        start = time.perf_counter()
+        stats = {}
+        moves = parallel_bfs(board, budget, num_workers=self.num_workers, batch_size=self.batch_size, verbose=self.verbose, stats=stats)
+        return self.result(moves, start, stats)
+
+# engines by name, new engines are added here
+ENGINES = {
+    MCTSEngine.name: MCTSEngine,
+    VanillaEngine.name: VanillaEngine,
+    BFSEngine.name: BFSEngine,
+    AStarEngine.name: AStarEngine,
+    IDAStarEngine.name: IDAStarEngine,
+    BidirectionalEngine.name: BidirectionalEngine,
+    ExternalBFSEngine.name: ExternalBFSEngine,
+    ParallelBFSEngine.name: ParallelBFSEngine,
+}
+
+def get_engine(name, **kwargs):
+    assert name in ENGINES, f"unknown engine {name}, available engines: {', '.join(ENGINES)}"
+    return ENGINES[name](**kwargs)
+
+# names of the keyword arguments the constructor of an engine takes
+def accepted_options(name):
+    assert name in ENGINES, f"unknown engine {name}, available engines: {', '.join(ENGINES)}"
+    # inspect is slow to import and only needed here
+    import inspect
+    return set(inspect.signature(ENGINES[name].__init__).parameters) - {"self"}
@@ -0,0 +1,171 @@
+import time
+import shutil
+import tempfile
+import numpy as np
+
+import os
+from deadlock_detection.detect_deadlocks import check_deadlock
+from game.encoding import StateEncoder
+from game.zobrist import state_key
+from utils.resources import peak_rss
+
+# breadth first search that keeps its frontier layers and visited set on disk, for exhaustive searches of large levels
+# every layer is stored as segments, each segment is a sorted array of zobrist keys and the matching packed states
+# (see game.encoding), segments are disjoint so the visited set is the union of all segments written so far
+# new states are encoded right away into a preallocated buffer of run_size keys and packed rows, once it is full the
+# buffer is sorted, checked against all segments on disk (memory mapped, binary search) and written as a new segment, so
+# only one run of packed states is resident at a time
+class ExternalBFS():
+    def __init__(self, board, workdir, run_size=2**20, chunk_size=2**14, verbose=0):
+        self.board = board
+        self.encoder = StateEncoder(board)
+        self.workdir = workdir
+        self.run_size = run_size
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+        # layers[d] is the list of segment names of layer d
+        self.layers = []
+        # (depth, key) of the first solved state found
+        self.solution = None
+        self.generated = 0
+        self.pruned = 0
+
+    def path(self, name, kind):
+        return os.path.join(self.workdir, f"{name}_{kind}.npy")
+
+    def keys(self, name):
+        return np.load(self.path(name, "keys"), mmap_mode="r")
+
+    def states(self, name):
+        return np.load(self.path(name, "states"), mmap_mode="r")
+
+    # iterates over the decoded boards of a layer, reading the segments in chunks
+    def boards(self, depth):
+        for name in self.layers[depth]:
+            states = self.states(name)
+            for begin in range(0, len(states), self.chunk_size):
+                for row in np.array(states[begin:begin + self.chunk_size]):
+                    yield self.encoder.decode(row, depth)
+
+    # sorts and deduplicates a buffer of keys and packed states, removes the states already on disk and writes the rest
+    # as a segment, returns the number of states written
+    def flush(self, depth, keys, states):
+        if len(keys) == 0:
+            return 0
+        keys, first = np.unique(keys, return_index=True)
+        states = states[first]
+        for layer in self.layers:
+            for name in layer:
+                segment = self.keys(name)
+                if len(segment) == 0:
+                    continue
+                positions = np.minimum(np.searchsorted(segment, keys), len(segment) - 1)
+                new = segment[positions] != keys
+                keys, states = keys[new], states[new]
+        name = f"layer_{depth}_{len(self.layers[depth])}"
+        np.save(self.path(name, "keys"), keys)
+        np.save(self.path(name, "states"), states)
+        self.layers[depth].append(name)
+        return len(keys)
+
+    # expands the last layer and writes the next one, returns the number of new states
+    # limit bounds the number of states of the new layer, the layer is then incomplete
+    def expand(self, limit=None):
+        depth = len(self.layers)
+        self.layers.append([])
+        keys = np.empty(self.run_size, dtype=np.int64)
+        states = np.empty((self.run_size, self.encoder.width), dtype=self.encoder.dtype)
+        buffered = 0
+        written = 0
+        for board in self.boards(depth - 1):
+            if limit is not None and written + buffered >= limit:
+                break
+            valid_moves = board.valid_moves()
+            for child in board.successors(valid_moves):
+                self.generated += 1
+                if child.solved():
+                    if self.solution is None:
+                        self.solution = (depth, state_key(child))
+                elif check_deadlock(child):
+                    self.pruned += 1
+                    continue
+                keys[buffered] = state_key(child)
+                states[buffered] = self.encoder.encode(child)
+                buffered += 1
+                if buffered == self.run_size:
+                    written += self.flush(depth, keys[:buffered], states[:buffered])
+                    buffered = 0
+        written += self.flush(depth, keys[:buffered], states[:buffered])
+        if written == 0:
+            self.layers.pop()
+        return written
+
+    # rebuilds the moves leading to the state with the given key in the given layer by searching each earlier layer
+    # for a predecessor, this scans one layer per push but is only done once
+    def reconstruct(self, depth, key):
+        moves = []
+        while depth > 0:
+            found = False
+            for board in self.boards(depth - 1):
+                valid_moves = board.valid_moves()
+                for move, child in zip(valid_moves, board.successors(valid_moves)):
+                    if state_key(child) == key:
+                        moves.append(move)
+                        key = state_key(board)
+                        found = True
+                        break
+                if found:
+                    break
+            assert found, "predecessor not found on disk"
+            depth -= 1
+        return moves[::-1]
+
+    # runs the search until the frontier is empty (exhaustive mode) or, if stop_at_solution is set, until the first layer
+    # containing a solved state, max_states bounds the number of states written to disk (checked after every expanded
+    # state, so a layer is cut off once it reaches the bound)
+    def run(self, max_states=None, stop_at_solution=True):
+        self.layers = [[]]
+        self.flush(0, np.array([state_key(self.board)], dtype=np.int64), self.encoder.encode_all([self.board]))
+        total = 1
+        layer_sizes = [1]
+        if self.board.solved():
+            self.solution = (0, state_key(self.board))
+        while self.solution is None or not stop_at_solution:
+            if max_states is not None and total >= max_states:
+                break
+            size = self.expand(None if max_states is None else max_states - total)
+            if size == 0:
+                break
+            total += size
+            layer_sizes.append(size)
+            if self.verbose >= 2:
+                print(f"Layer {len(self.layers) - 1}: {size} states, {total} states in total", end="\r")
+        self.layer_sizes = layer_sizes
+        if self.solution is None:
+            return None
+        return self.reconstruct(*self.solution)
+
+    # bytes used by the segments on disk
+    def disk_usage(self):
+        return sum(os.path.getsize(os.path.join(self.workdir, file)) for file in os.listdir(self.workdir))
+
+# external memory breadth first search, the budget is the number of states written to disk
+# workdir is the directory the segments are written to, a temporary directory (removed afterwards) if None
+def external_bfs(board, num_iters, workdir=None, exhaustive=False, run_size=2**20, verbose=0, stats=None):
+    start = time.perf_counter()
+    temporary = workdir is None
+    if temporary:
+        workdir = tempfile.mkdtemp(prefix="schokoban_")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        search = ExternalBFS(board, workdir, run_size=run_size, verbose=verbose)
+        moves = search.run(max_states=num_iters, stop_at_solution=not exhaustive)
+        if stats is not None:
+            elapsed = time.perf_counter() - start
+            stats.update(generated=search.generated, pruned=search.pruned, states=sum(search.layer_sizes),
+                         layers=search.layer_sizes, disk_bytes=search.disk_usage(),
+                         states_per_sec=search.generated / elapsed if elapsed > 0 else 0.0, peak_rss_mb=peak_rss())
+    finally:
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return moves
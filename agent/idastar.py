@@ -0,0 +1,142 @@
+import time
+import numpy as np
+
+from deadlock_detection.detect_deadlocks import check_deadlock
+from game.zobrist import state_key
+from reward_functions.heuristics import get_heuristic
+from utils.resources import peak_rss
+
+FOUND = -1
+INF = float("inf")
+
+# fixed size transposition table, entries are indexed by the lower bits of the zobrist key
+# every entry stores the depth a state was searched at during an iteration and a learned lower bound on the pushes left
+class TranspositionTable():
+    def __init__(self, size):
+        assert size & (size - 1) == 0, "the size of the transposition table has to be a power of two"
+        self.mask = size - 1
+        self.keys = np.zeros(size, dtype=np.int64)
+        self.depths = np.zeros(size, dtype=np.int32)
+        self.iterations = np.full(size, -1, dtype=np.int32)
+        self.bounds = np.zeros(size, dtype=np.int32)
+        self.stores = 0
+        self.hits = 0
+
+    def probe(self, key):
+        index = key & self.mask
+        if self.keys[index] == key and self.iterations[index] != -1:
+            self.hits += 1
+            return index
+        return None
+
+    # replacement scheme: entries of older iterations are always replaced, within an iteration shallower searches are kept
+    # as they save more work when the state is reached again
+    def store(self, key, depth, iteration, bound):
+        index = key & self.mask
+        if self.iterations[index] == iteration and self.keys[index] != key and self.depths[index] < depth:
+            return
+        self.keys[index] = key
+        self.depths[index] = depth
+        self.iterations[index] = iteration
+        self.bounds[index] = bound
+        self.stores += 1
+
+# IDA* search over push moves on a single board that is modified in place (push/undo)
+# memory use is bounded by the transposition table and the search depth, independent of the size of the level
+# children are searched in order of their heuristic value, deadlocked children are pruned with check_deadlock
+# endgame (an EndgameTable, optional) is probed at every node, a state found in the table is finished from the table right
+# away, the solution is then no longer guaranteed to use the minimal number of pushes
+# num_iters limits the number of expanded states, stats (if given) is filled with search statistics
+def idastar(board, num_iters, heuristic="min_cost_matching", tt_size=2**20, verbose=0, stats=None, endgame=None):
+    start = time.perf_counter()
+    h = get_heuristic(heuristic)
+    board = board.copy()
+    table = TranspositionTable(tt_size)
+    path = []
+    on_path = set()
+    counters = {"expanded": 0, "generated": 0, "pruned": 0}
+    iteration = 0
+
+    def search(g, bound, h_value):
+        if g + h_value > bound:
+            return g + h_value
+        if board.solved():
+            return FOUND
+        if counters["expanded"] >= num_iters:
+            return INF
+        key = state_key(board)
+        tail = None if endgame is None else endgame.finish(board)
+        if tail is not None:
+            path.extend(tail)
+            return FOUND
+        if key in on_path:
+            return INF
+        index = table.probe(key)
+        if index is not None:
+            # the state was already searched from the same or a lower depth during this iteration
+            if table.iterations[index] == iteration and table.depths[index] <= g:
+                return INF
+            # lower bound learned in an earlier iteration
+            if table.bounds[index] > h_value:
+                h_value = int(table.bounds[index])
+                if g + h_value > bound:
+                    return g + h_value
+        table.store(key, g, iteration, h_value)
+        counters["expanded"] += 1
+
+        # move ordering by the heuristic value of the children
+        children = []
+        for move in board.valid_moves():
+            counters["generated"] += 1
+            undo = board.push(*move)
+            if board.solved():
+                children.append((0, move))
+            elif check_deadlock(board):
+                counters["pruned"] += 1
+            else:
+                children.append((h(board), move))
+            board.undo(undo)
+        children.sort(key=lambda child: child[0])
+
+        on_path.add(key)
+        minimum = INF
+        for child_h, move in children:
+            undo = board.push(*move)
+            path.append(move)
+            t = search(g + 1, bound, child_h)
+            if t == FOUND:
+                return FOUND
+            path.pop()
+            board.undo(undo)
+            minimum = min(minimum, t)
+        on_path.discard(key)
+
+        # remember the improved lower bound for the next iterations
+        if minimum != INF:
+            index = table.probe(key)
+            if index is not None:
+                table.bounds[index] = max(table.bounds[index], minimum - g)
+        return minimum
+
+    bound = h(board)
+    moves = None
+    while counters["expanded"] < num_iters:
+        t = search(0, bound, h(board))
+        if t == FOUND:
+            moves = list(path)
+            break
+        if t == INF:
+            break
+        if verbose >= 2:
+            print(f"Iteration {iteration}, bound: {bound}, expanded: {counters['expanded']}", end="\r")
+        bound = t
+        iteration += 1
+
+    if stats is not None:
+        elapsed = time.perf_counter() - start
+        stats.update(expanded=counters["expanded"], generated=counters["generated"], pruned=counters["pruned"],
+                     iterations=iteration + 1, bound=bound, tt_hits=table.hits, tt_stores=table.stores,
+                     states_per_sec=counters["generated"] / elapsed if elapsed > 0 else 0.0, peak_rss_mb=peak_rss())
+        if endgame is not None:
+            stats.update(endgame_probes=endgame.probes, endgame_hits=endgame.hits)
+    return moves
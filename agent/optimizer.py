@@ -0,0 +1,113 @@
+import time
+
+from agent.bfs import reconstruct
+from game.zobrist import state_key
+
+# post-processing of solutions found by a search (e.g. MCTS), the solution is shortened by
+# - cutting loops: the pushes between two visits of the same state are removed
+# - shortcuts: a breadth first search of bounded depth and size from every state of the solution looks for a shorter way
+#   to a later state of the solution (or to any solved state), which then replaces the pushes in between
+# the result is verified on the board (push/undo) and the original solution is returned if the verification fails
+
+# returns the boards along a solution, boards[i] is the state after the first i moves
+def replay(board, moves):
+    boards = [board]
+    for move in moves:
+        boards.append(boards[-1].move(*move))
+    return boards
+
+# removes the pushes between two visits of the same state
+def cut_loops(board, moves):
+    keys = [state_key(b) for b in replay(board, moves)]
+    result = []
+    # index into result of every state on the shortened path
+    index = {keys[0]: 0}
+    for move, key in zip(moves, keys[1:]):
+        if key in index:
+            del result[index[key]:]
+            index = {k: i for k, i in index.items() if i <= index[key]}
+        else:
+            result.append(move)
+            index[key] = len(result)
+    return result
+
+# breadth first search from boards[i] for a shorter way to one of the next window states of the solution
+# returns (first index after the shortcut, moves of the shortcut) of the largest saving, None if there is no shortcut
+def shortcut(boards, keys, i, window, max_states):
+    n = len(boards) - 1
+    targets = {keys[j]: j for j in range(i + 2, min(i + window, n) + 1)}
+    max_depth = min(window, n - i) - 1
+    root = keys[i]
+    parents = {root: (None, None)}
+    layer = [boards[i]]
+    best = None
+    for depth in range(1, max_depth + 1):
+        next_layer = []
+        for current in layer:
+            if len(parents) >= max_states:
+                break
+            current_key = state_key(current)
+            valid_moves = current.valid_moves()
+            for move, child in zip(valid_moves, current.successors(valid_moves)):
+                key = state_key(child)
+                if key in parents:
+                    continue
+                parents[key] = (current_key, move)
+                # solved states are interchangeable with the end of the solution
+                j = n if child.solved() else targets.get(key)
+                if j is not None and j - i - depth > 0 and (best is None or j - i - depth > best[0]):
+                    best = (j - i - depth, j, key)
+                next_layer.append(child)
+                if len(parents) >= max_states:
+                    break
+        # a state of the next layer saves at most n - i - (depth + 1) pushes (reaching the solved end of the solution), the
+        # search stops once the best shortcut found so far saves as many, otherwise it finishes the depth bound
+        if len(parents) >= max_states or (best is not None and best[0] >= n - i - (depth + 1)):
+            break
+        layer = next_layer
+    if best is None:
+        return None
+    return best[1], reconstruct(parents, best[2])
+
+# checks that the moves solve the board, only pushes generated by valid_moves() are accepted
+def verify(board, moves):
+    board = board.copy()
+    for move in moves:
+        if tuple(move) not in board.valid_moves():
+            return False
+        board.push(*move)
+    return board.solved()
+
+# shortens a solution of the given board, window bounds the number of pushes a shortcut replaces and max_states the size
+# of each local search, searches are started every stride pushes (a shortcut starting in between is usually also found
+# from the state before as it is one push longer), stats (if given) is filled with the lengths before and after and the
+# time spent
+def optimize(board, moves, window=20, max_states=300, stride=3, verbose=0, stats=None):
+    start = time.perf_counter()
+    original = moves
+    moves = cut_loops(board, moves)
+    loop_length = len(moves)
+    shortcuts = 0
+    boards = replay(board, moves)
+    keys = [state_key(b) for b in boards]
+    i = 0
+    while i < len(moves):
+        found = shortcut(boards, keys, i, window, max_states)
+        if found is None:
+            i += stride
+            continue
+        j, path = found
+        moves = moves[:i] + path + moves[j:]
+        boards = boards[:i] + replay(boards[i], moves[i:])
+        keys = keys[:i] + [state_key(b) for b in boards[i:]]
+        shortcuts += 1
+        if verbose >= 2:
+            print(f"Shortcut at push {i}, solution length: {len(moves)}", end="\r")
+
+    verified = verify(board, moves)
+    if not verified:
+        moves = list(original)
+    if stats is not None:
+        stats.update(original_length=len(original), loop_cut_length=loop_length, optimized_length=len(moves),
+                     shortcuts=shortcuts, verified=verified, optimize_time=time.perf_counter() - start)
+    return moves
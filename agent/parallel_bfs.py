@@ -0,0 +1,156 @@
+import multiprocessing as mp
+import time
+
+import os
+from deadlock_detection.detect_deadlocks import check_deadlock
+from game.encoding import StateEncoder
+from game.shared import SharedLevel
+from game.zobrist import state_key
+from utils.resources import peak_rss
+
+# layer synchronous breadth first search distributed over several processes
+# every state is owned by the worker key % num_workers, the owner keeps the parent pointer of the state in its slice of
+# the visited set and expands the state in the next layer
+# successors are sent to their owners in batches of packed states (see game.encoding) through the workers' queues
+
+# worker process, commands are read from the inbox:
+# ("seed", key, row): adds the start state, ("expand",): expands the current layer, ("parent", key): looks up a parent
+# pointer, ("stop",): ends the worker, ("states", batch) and ("done",) are sent between the workers during a layer
+# the level data is shared by the coordinating process (see game.shared)
+def worker(index, shared, inboxes, results, batch_size):
+    board = shared.board()
+    encoder = StateEncoder(board)
+    num_workers = len(inboxes)
+    inbox = inboxes[index]
+    visited = {}
+    frontier = []
+    # successors sent by faster workers can arrive before this worker received its own "expand" command
+    early = []
+    while True:
+        command = inbox.get()
+        if command[0] == "stop":
+            return
+        elif command[0] in ("states", "done"):
+            early.append(command)
+        elif command[0] == "seed":
+            _, key, row = command
+            visited[key] = (None, None)
+            frontier = [(key, row)]
+        elif command[0] == "parent":
+            results.put(("parent", command[1], visited[command[1]]))
+        elif command[0] == "expand":
+            batches = [[] for _ in range(num_workers)]
+            generated = 0
+            pruned = 0
+            for parent_key, row in frontier:
+                current = encoder.decode(row)
+                valid_moves = current.valid_moves()
+                for move, child in zip(valid_moves, current.successors(valid_moves)):
+                    generated += 1
+                    solved = child.solved()
+                    if not solved and check_deadlock(child):
+                        pruned += 1
+                        continue
+                    key = state_key(child)
+                    owner = key % num_workers
+                    batches[owner].append((key, tuple(encoder.encode(child)), parent_key, tuple(int(x) for x in move), solved))
+                    if len(batches[owner]) >= batch_size:
+                        inboxes[owner].put(("states", batches[owner]))
+                        batches[owner] = []
+            for owner in range(num_workers):
+                if batches[owner]:
+                    inboxes[owner].put(("states", batches[owner]))
+                inboxes[owner].put(("done",))
+
+            # collect the successors owned by this worker until every worker finished the layer
+            frontier = []
+            solved_key = None
+            done = 0
+            while done < num_workers:
+                message = early.pop(0) if early else inbox.get()
+                # the coordinating process stops the workers in the middle of a layer if it is interrupted
+                if message[0] == "stop":
+                    return
+                if message[0] == "done":
+                    done += 1
+                    continue
+                for key, row, parent_key, move, solved in message[1]:
+                    if key in visited:
+                        continue
+                    visited[key] = (parent_key, move)
+                    frontier.append((key, row))
+                    if solved and solved_key is None:
+                        solved_key = key
+            results.put(("layer", index, len(frontier), solved_key, generated, pruned))
+
+# parallel breadth first search, the budget is the number of states in the visited set
+# num_workers defaults to the number of cpus, peak_rss_mb in the stats is the memory of the coordinating process only
+# the solution found (if any) uses the minimal number of pushes
+def parallel_bfs(board, num_iters, num_workers=None, batch_size=256, verbose=0, stats=None):
+    start = time.perf_counter()
+    num_workers = num_workers or os.cpu_count()
+    inboxes = [mp.Queue() for _ in range(num_workers)]
+    results = mp.Queue()
+    root = state_key(board)
+    states = 1
+    generated = 0
+    pruned = 0
+    layers = [1]
+    solved_key = root if board.solved() else None
+    # the shared level and the workers are created inside the try, so they are cleaned up if starting a worker fails
+    shared = None
+    workers = []
+    try:
+        shared = SharedLevel(board)
+        for i in range(num_workers):
+            process = mp.Process(target=worker, args=(i, shared, inboxes, results, batch_size), daemon=True)
+            process.start()
+            workers.append(process)
+        inboxes[root % num_workers].put(("seed", root, tuple(StateEncoder(board).encode(board))))
+
+        while solved_key is None and states < num_iters:
+            for inbox in inboxes:
+                inbox.put(("expand",))
+            size = 0
+            for _ in range(num_workers):
+                _, _, frontier, solved, worker_generated, worker_pruned = results.get()
+                size += frontier
+                generated += worker_generated
+                pruned += worker_pruned
+                if solved is not None and solved_key is None:
+                    solved_key = solved
+            if size == 0:
+                break
+            states += size
+            layers.append(size)
+            if verbose >= 2:
+                print(f"Layer {len(layers) - 1}: {size} states, {states} states in total", end="\r")
+
+        # follow the parent pointers, each one is stored by the owner of the state
+        moves = None
+        if solved_key is not None:
+            moves = []
+            key = solved_key
+            while True:
+                inboxes[key % num_workers].put(("parent", key))
+                _, _, (parent, move) = results.get()
+                if move is None:
+                    break
+                moves.append(move)
+                key = parent
+            moves = moves[::-1]
+    finally:
+        for inbox in inboxes:
+            inbox.put(("stop",))
+        for process in workers:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        if shared is not None:
+            shared.close()
+
+    if stats is not None:
+        elapsed = time.perf_counter() - start
+        stats.update(generated=generated, pruned=pruned, states=states, layers=layers, workers=num_workers,
+                     states_per_sec=generated / elapsed if elapsed > 0 else 0.0, peak_rss_mb=peak_rss())
+    return moves
@@ -0,0 +1,86 @@
+import multiprocessing as mp
+import queue
+import random
+import signal
+import time
+
+import game.Sokoban as Sokoban
+from game.shared import SharedLevel
+from agent.engine import Result, accepted_options, get_engine
+
+# the race terminates the engines that lost, the signal is turned into an exception in their processes so the engines
+# stop through their finally blocks and clean up (e.g. the layer directory of external, the workers of parallel)
+def stop(signum, frame):
+    raise SystemExit(1)
+
+# runs a single engine of the portfolio in its own process and reports the result back
+# the board is built on the level data shared by the parent (see game.shared)
+def race(name, engine, shared, budget, seed, results):
+    signal.signal(signal.SIGTERM, stop)
+    random.seed(seed)
+    results.put((name, engine.solve(shared.board(), budget)))
+
+# races several engines on the same level, each on a separate core
+# the first engine that solves the level wins and all other engines are terminated
+# budget is either a single budget for all engines or a dictionary with a budget per engine name
+# timeout (in seconds) bounds the wall time of the whole race
+# board: the initial board of the level if it is loaded already, the level is loaded once by this process otherwise
+# engine_options: keyword arguments of the engines (see agent.engine), every engine gets the ones its constructor takes
+# (e.g. prior only reaches schoko) and an option none of the engines takes is an error
+def solve_portfolio(level_id, folder, engines, budget, timeout=None, seed=None, board=None, engine_options=None):
+    start = time.perf_counter()
+    engine_options = engine_options or {}
+    accepted = {name: accepted_options(name) for name in engines}
+    unused = set(engine_options) - set().union(*accepted.values())
+    assert not unused, f"options {', '.join(sorted(unused))} are not taken by any of the engines {', '.join(engines)}"
+    instances = {name: get_engine(name, **{key: value for key, value in engine_options.items() if key in accepted[name]})
+                 for name in engines}
+    if board is None:
+        board = Sokoban.SokobanBoard(level_id=level_id, folder=folder)
+    with SharedLevel(board) as shared:
+        winner, finished = run_race(instances, shared, budget, timeout, seed, start)
+
+    stats = {"engine": "portfolio", "time": time.perf_counter() - start, "engines": list(engines), "finished": finished}
+    if winner is None:
+        return Result("LOSS", None, stats)
+    name, result = winner
+    stats["winner"] = name
+    return Result("WIN", result.moves, stats)
+
+# starts a process per engine and waits for the first solution, the processes still running are terminated before it
+# returns the winner (name and result, None if no engine solved the level) and the statistics of the finished engines
+# the processes are not daemonic, engines such as parallel start processes of their own, so they are terminated and
+# joined here whether the race ends normally or not
+def run_race(engines, shared, budget, timeout, seed, start):
+    results = mp.Queue()
+    processes = {}
+    winner = None
+    finished = {}
+    try:
+        for i, (name, engine) in enumerate(engines.items()):
+            engine_budget = budget[name] if isinstance(budget, dict) else budget
+            engine_seed = None if seed is None else seed + i
+            processes[name] = mp.Process(target=race, args=(name, engine, shared, engine_budget, engine_seed, results))
+            processes[name].start()
+
+        while winner is None and len(finished) < len(processes):
+            if timeout is not None and time.perf_counter() - start > timeout:
+                break
+            try:
+                name, result = results.get(timeout=0.1)
+            except queue.Empty:
+                # engines that crashed never report back
+                if all(not process.is_alive() for process in processes.values()) and results.empty():
+                    break
+                continue
+            finished[name] = result.stats
+            if result.outcome == "WIN":
+                winner = (name, result)
+    finally:
+        # cancel the engines that are still running
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in processes.values():
+            process.join()
+    return winner, finished
@@ -0,0 +1,121 @@
+import time
+import json
+import cProfile
+
+import agent.MCTS as MCTS
+import game.Sokoban as Sokoban
+
+# phases of MCTS.run that are timed: (name, owner, attribute), the attribute of the owner is replaced by a timed wrapper
+# while the profiler is active and restored afterwards, so the search runs the unmodified code when profiling is off
+# check_deadlock and min_cost_matching are timed where SokobanBoard.reward() looks them up
+PHASES = [
+    ("selection", MCTS.MCTS, "select_leaf"),
+    ("expansion", MCTS.MCTS, "expand"),
+    ("simulation", MCTS.Node, "simulate"),
+    ("backpropagation", MCTS.Node, "update"),
+    ("reparenting", MCTS.Node, "adopt"),
+    ("removal", MCTS.Node, "remove"),
+    ("valid_moves", Sokoban.SokobanBoard, "valid_moves"),
+    ("successors", Sokoban.SokobanBoard, "successors"),
+    ("move", Sokoban.SokobanBoard, "move"),
+    ("reward", Sokoban.SokobanBoard, "reward"),
+    ("check_deadlock", Sokoban, "check_deadlock"),
+    ("min_cost_matching", Sokoban, "min_cost_matching"),
+]
+
+# cumulative time and number of calls of the phases of MCTS.run, used as a context manager around the search loop
+# times are inclusive (the reward includes the deadlock check and the matching, selection includes the lazy evaluation of
+# the rewards of the selected nodes), recursive calls (backpropagation, removal) are counted once per outermost call
+class PhaseProfiler():
+    def __init__(self, phases=PHASES):
+        self.phases = phases
+        self.calls = {name: 0 for name, _, _ in phases}
+        self.seconds = {name: 0.0 for name, _, _ in phases}
+        self.elapsed = 0.0
+        self.originals = []
+
+    def wrap(self, name, function):
+        calls, seconds = self.calls, self.seconds
+        active = [False]
+        def timed(*args, **kwargs):
+            if active[0]:
+                return function(*args, **kwargs)
+            active[0] = True
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds[name] += time.perf_counter() - start
+                calls[name] += 1
+                active[0] = False
+        return timed
+
+    def __enter__(self):
+        for name, owner, attribute in self.phases:
+            original = getattr(owner, attribute)
+            self.originals.append((owner, attribute, original))
+            setattr(owner, attribute, self.wrap(name, original))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed += time.perf_counter() - self.start
+        for owner, attribute, original in reversed(self.originals):
+            setattr(owner, attribute, original)
+        self.originals = []
+        return False
+
+    # phase times and the counters of the tree as a JSON serializable dict
+    def report(self, tree=None):
+        phases = {}
+        for name, _, _ in self.phases:
+            calls, seconds = self.calls[name], self.seconds[name]
+            phases[name] = {"calls": calls, "seconds": seconds, "mean_us": 1e6 * seconds / calls if calls else 0.0,
+                            "share": seconds / self.elapsed if self.elapsed > 0 else 0.0}
+        report = {"elapsed": self.elapsed, "phases": phases}
+        if tree is not None:
+            report["counters"] = tree_counters(tree)
+            report["iterations_per_sec"] = tree.iterations / self.elapsed if self.elapsed > 0 else 0.0
+        return report
+
+    def save(self, path, tree=None):
+        with open(path, "w") as f:
+            json.dump(self.report(tree), f, indent=2)
+
+    def print(self, tree=None):
+        report = self.report(tree)
+        print(f"{'phase':<18} {'calls':>9} {'seconds':>9} {'mean us':>9} {'share':>7}")
+        for name, phase in report["phases"].items():
+            print(f"{name:<18} {phase['calls']:>9} {phase['seconds']:>9.3f} {phase['mean_us']:>9.1f} {phase['share']:>7.1%}")
+        for name, value in report.get("counters", {}).items():
+            print(f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}")
+
+# counters of a tree that are maintained during every search
+def tree_counters(tree):
+    transpositions = tree.generated - tree.created
+    return {"iterations": tree.iterations, "nodes": len(tree.nodes), "removed_nodes": len(tree.del_nodes),
+            "generated": tree.generated, "created": tree.created, "transpositions": transpositions,
+            "transposition_rate": transpositions / tree.generated if tree.generated else 0.0}
+
+# profiler writing a cProfile trace of the search (e.g. for snakeviz or flameprof) instead of the phase times
+class TraceProfiler():
+    def __init__(self, path):
+        self.path = path
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.disable()
+        return False
+
+    def save(self, path=None, tree=None):
+        self.profile.dump_stats(path or self.path)
+
+# profiler for the given output file: a cProfile trace for .prof and .pstats files, phase times as JSON otherwise
+def get_profiler(path):
+    if path.endswith(".prof") or path.endswith(".pstats"):
+        return TraceProfiler(path)
+    return PhaseProfiler()
@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+import itertools
+import multiprocessing as mp
+
+import agent.batch as batch
+from agent.batch import complete_job, solve_job
+from utils.solution_store import to_json
+
+# local solve service: solve requests are queued by priority and run on a pool of worker processes, every worker keeps its
+# solver (and so the levels it loaded) across jobs, so small queries do not pay the start-up of the solver
+# requests and responses are lines of JSON over a Unix socket or a TCP connection to localhost, a connection may send
+# several requests, they are answered in order:
+#   {"op": "solve", "folder": ..., "level_id": ..., ...}  a job as read by agent.batch, plus "priority" (higher runs
+#       first, default 0), "timeout" (seconds of wall time, None for no limit) and "wait" (default true, answer with the
+#       result once the job is done, otherwise with its id right away)
+#   {"op": "result", "id": ..., "wait": true}  result of a job (waits for it unless wait is false)
+#   {"op": "cancel", "id": ...}  removes a queued job or stops a running one (its worker is replaced)
+#   {"op": "status"}  the jobs known to the service and the number of workers
+#   {"op": "shutdown"}  stops the service
+# the result of a job is the one written by agent.batch, with the outcome "CANCELLED" or "TIMEOUT" if it was stopped
+
+# loop of a worker process, solves the jobs sent over the pipe until it is closed
+def work(conn):
+    while True:
+        try:
+            number, job, moves = conn.recv()
+        except EOFError:
+            return
+        conn.send(solve_job(number, job, moves))
+
+# imports the modules (most of all scipy) the searches need, done by the service before it starts its workers, so forked
+# workers, including the ones replacing stopped workers, start warm
+def preload():
+    import agent.MCTS
+    from scipy.optimize import linear_sum_assignment
+
+# a worker process and the pipe to it, stopping the process (to cancel its job) makes the pending receive fail
+class Worker():
+    def __init__(self):
+        self.conn, child = mp.Pipe()
+        self.process = mp.Process(target=work, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.pending = None
+
+    async def solve(self, number, job, moves):
+        self.conn.send((number, job, moves))
+        # the receive blocks, so it is run in a thread of the event loop, it is shielded so that a timeout does not
+        # abandon the thread before the process is stopped
+        self.pending = asyncio.get_running_loop().run_in_executor(None, self.conn.recv)
+        return await asyncio.shield(self.pending)
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.terminate()
+
+    # stops the process and releases the pipe once the pending receive failed
+    async def close(self):
+        self.stop()
+        if self.pending is not None:
+            await asyncio.wait([self.pending])
+            self.pending.exception()
+        self.process.join()
+        self.conn.close()
+
+class Job():
+    def __init__(self, number, spec, priority=0, timeout=None, moves=False):
+        self.number = number
+        self.spec = spec
+        self.priority = priority
+        self.timeout = timeout
+        self.moves = moves
+        # queued, running, done or cancelled
+        self.status = "queued"
+        self.result = None
+        self.done = asyncio.Event()
+        self.worker = None
+
+    def finish(self, result):
+        self.result = result
+        if self.status != "cancelled":
+            self.status = "done"
+        self.done.set()
+
+    def summary(self):
+        return {"id": self.number, "status": self.status, "priority": self.priority, "folder": self.spec["folder"],
+                "level_id": self.spec["level_id"], "mode": self.spec["mode"], "budget": self.spec["budget"]}
+
+class SolveService():
+    # workers: number of worker processes, budget and mode: defaults of the jobs that do not give one
+    # history: number of finished jobs whose results are kept
+    def __init__(self, workers=2, budget=1000, mode="schoko", history=1000):
+        self.num_workers = workers
+        self.budget = budget
+        self.mode = mode
+        self.history = history
+        self.jobs = {}
+        self.numbers = itertools.count()
+        # order of jobs with the same priority
+        self.order = itertools.count()
+        self.queue = None
+        self.workers = []
+        self.closed = None
+
+    # queues a job and returns it, the spec is a job as read by agent.batch
+    def submit(self, spec, priority=0, timeout=None, moves=False):
+        job = Job(next(self.numbers), spec, priority, timeout, moves)
+        self.jobs[job.number] = job
+        self.queue.put_nowait((-priority, next(self.order), job))
+        return job
+
+    def cancel(self, job):
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finish(dict(job.spec, job=job.number, outcome="CANCELLED"))
+        elif job.status == "running":
+            # the dispatcher of the worker sees the receive fail, finishes the job and replaces the worker
+            job.status = "cancelled"
+            job.worker.stop()
+
+    # runs the queued jobs on the worker of the given slot one after the other, a worker that was stopped is replaced
+    async def dispatch(self, slot):
+        while True:
+            _, _, job = await self.queue.get()
+            if job.status != "queued":
+                continue
+            job.status = "running"
+            job.worker = worker = self.workers[slot]
+            replace = True
+            try:
+                result = await asyncio.wait_for(worker.solve(job.number, job.spec, job.moves), job.timeout)
+                replace = False
+            except asyncio.TimeoutError:
+                result = dict(job.spec, job=job.number, outcome="TIMEOUT", time=job.timeout)
+            except (EOFError, OSError):
+                result = dict(job.spec, job=job.number, outcome="CANCELLED" if job.status == "cancelled" else "ERROR")
+            if replace:
+                await worker.close()
+                self.workers[slot] = Worker()
+            job.worker = None
+            job.finish(result)
+            self.forget()
+
+    # drops the oldest finished jobs beyond the history
+    def forget(self):
+        finished = [number for number, job in self.jobs.items() if job.done.is_set()]
+        for number in finished[:max(len(finished) - self.history, 0)]:
+            del self.jobs[number]
+
+    async def handle(self, message):
+        op = message.get("op")
+        if op == "solve":
+            spec = complete_job({key: value for key, value in message.items() if key not in ("op", "priority", "timeout", "wait", "moves")},
+                                self.budget, self.mode)
+            job = self.submit(spec, message.get("priority", 0), message.get("timeout"), message.get("moves", False))
+            if not message.get("wait", True):
+                return job.summary()
+            await job.done.wait()
+            return job.result
+        if op in ("result", "cancel"):
+            job = self.jobs.get(message.get("id"))
+            if job is None:
+                return {"error": f"unknown job {message.get('id')}"}
+            if op == "cancel":
+                self.cancel(job)
+                return job.summary()
+            if message.get("wait", True):
+                await job.done.wait()
+            return job.result if job.done.is_set() else job.summary()
+        if op == "status":
+            return {"workers": len(self.workers), "queued": sum(job.status == "queued" for job in self.jobs.values()),
+                    "jobs": [job.summary() for job in self.jobs.values()]}
+        if op == "shutdown":
+            self.closed.set()
+            return {"status": "shutdown"}
+        return {"error": f"unknown op {op}"}
+
+    async def connection(self, reader, writer):
+        try:
+            while not reader.at_eof():
+                line = await reader.readline()
+                if not line.strip():
+                    continue
+                try:
+                    response = await self.handle(json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {"error": f"{type(e).__name__}: {e}"}
+                writer.write((json.dumps(response, default=to_json) + "\n").encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # the client went away or the service is shutting down
+            pass
+        finally:
+            writer.close()
+
+    # serves on the Unix socket at the given path, or on localhost at the given port, until a shutdown request
+    async def serve(self, path=None, port=None):
+        self.queue = asyncio.PriorityQueue()
+        self.closed = asyncio.Event()
+        preload()
+        self.workers = [Worker() for _ in range(self.num_workers)]
+        dispatchers = [asyncio.create_task(self.dispatch(slot)) for slot in range(self.num_workers)]
+        if port is not None:
+            server = await asyncio.start_server(self.connection, "127.0.0.1", port)
+        else:
+            server = await asyncio.start_unix_server(self.connection, path)
+        try:
+            await self.closed.wait()
+        finally:
+            # connections still waiting for a job are cancelled when the event loop is closed
+            server.close()
+            for dispatcher in dispatchers:
+                dispatcher.cancel()
+            for worker in self.workers:
+                await worker.close()
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+# sends the requests to a running service and returns the responses
+async def request(messages, path=None, port=None):
+    if port is not None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    else:
+        reader, writer = await asyncio.open_unix_connection(path)
+    responses = []
+    for message in messages:
+        writer.write((json.dumps(message) + "\n").encode())
+        await writer.drain()
+        responses.append(json.loads(await reader.readline()))
+    writer.close()
+    await writer.wait_closed()
+    return responses
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local solve service and its client')
+    parser.add_argument('command', choices=["serve", "request"], help='run the service or send requests to it')
+    parser.add_argument('requests', type=str, nargs='*', help='request: JSON requests, read one per line from stdin if none are given')
+    parser.add_argument('--socket', type=str, default="schokoban.sock", help='path of the Unix socket')
+    parser.add_argument('--port', type=int, default=None, help='serve on this port of localhost instead of the Unix socket')
+    parser.add_argument('--workers', type=int, default=2, help='serve: number of worker processes')
+    parser.add_argument('--budget', type=int, default=1000, help='serve: budget of the jobs that do not give one')
+    parser.add_argument('--mode', type=str, default="schoko", help='serve: engine of the jobs that do not give one')
+    parser.add_argument('--store', type=str, default=None, help='serve: solution store (SQLite) shared by the workers')
+    args = parser.parse_intermixed_args()
+
+    if args.command == "serve":
+        # the workers are forked after this and open the store themselves
+        batch.store_path = args.store
+        service = SolveService(workers=args.workers, budget=args.budget, mode=args.mode)
+        asyncio.run(service.serve(path=args.socket, port=args.port))
+    else:
+        messages = [json.loads(line) for line in (args.requests or sys.stdin) if line.strip()]
+        for response in asyncio.run(request(messages, path=args.socket, port=args.port)):
+            print(json.dumps(response))
@@ -1,32 +1,44 @@
-import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import game.Sokoban as Sokoban
-from deadlock_detection.precompute_deadlocks import compute_deadlocks
-from utils.est_search_space import count_boxes, calculate_tiles
-from scipy.special import comb
+from deadlock_detection.detect_deadlocks import check_deadlock
+from agent.engine import Result, get_engine
+from utils.progress import Progress
 
 class Solver():
-    def __init__(self):
-        pass
+    # store: utils.solution_store.SolutionStore looked up before every search and updated with every solution found
+    # reuse: what a stored solution is used for, "solution" returns it (once its replay solved the level) instead of
+    # searching, "prefix" searches anyway and warm starts schoko with the first prefix_fraction of its moves (e.g. to
+    # compare configurations), the prefix is at least one move short of the stored solution so the search has to finish it
+    def __init__(self, store=None, reuse="solution", prefix_fraction=0.5):
+        assert reuse in ["solution", "prefix"], f"unknown reuse {reuse}, use solution or prefix"
+        assert 0 <= prefix_fraction < 1, "the prefix fraction has to be in [0, 1)"
+        # result of the last search, including the statistics reported by the engine
+        self.result = None
+        # initial boards by (folder, level_id), a solver used for several searches loads every level once
+        self.boards = {}
+        self.store = store
+        self.reuse = reuse
+        self.prefix_fraction = prefix_fraction
     
     def print(self, string, verbose):
         if verbose >= 3:
             print(string)            
     
-    def solve(self, level_id, folder, num_iters, verbose=0, mode="schoko"):
-        if mode == "schoko":
-            import agent.MCTS as MCTS
-        else:
-            import agent.MCTS_vanilla as MCTS
-        
-        file_path = "deadlock_detection/"+folder+"level_"+str(level_id)+".npy"
-        
-        if not os.path.isfile(file_path) or not (folder in ["Microban/", "CBC/"]):
-            compute_deadlocks(level_id, folder, verbose=0)
-            
+    # mode is the name of the engine used (see agent.engine.ENGINES) or "portfolio" to race the given engines against each other
+    # num_iters is the budget passed to the engine, for schoko it is the total number of iterations including the ones of a resumed tree
+    # resume: path of a checkpoint to continue from, checkpoint: path the tree is saved to after the search
+    # prefix: list of moves (e.g. from a previous run) used to warm start the search
+    # engine_options: additional keyword arguments passed to the engine, e.g. {"weight": 2} for astar or {"endgame": path}
+    # progress: consumer of the progress events (see utils.progress), receives a start and a finish event and the progress
+    # events of MCTS engines at most every progress_interval seconds
+    def solve(self, level_id, folder, num_iters, verbose=0, mode="schoko", resume=None, checkpoint=None, prefix=None, engines=None, engine_options=None,
+              progress=None, progress_interval=0.5):
+        board = self.board(level_id, folder)
 
+        # the search space estimate is only imported when it is needed
         if verbose >= 2:
+            from utils.est_search_space import count_boxes, calculate_tiles
+            from scipy.special import comb
             path = folder + f"level_{level_id}.txt"
             n, b = count_boxes(path)
             path = f"deadlock_detection/" + folder + f"level_{level_id}.npy"
@@ -35,22 +47,85 @@ class Solver():
             
         self.print("Solving Sokoban", verbose)
         
-        board = Sokoban.SokobanBoard(level_id=level_id, folder=folder)
-    
         self.print(board, verbose)
-        tree = MCTS.MCTS(board)
-        moves = tree.run(num_iters, verbose=verbose)
+        if resume is not None or checkpoint is not None or prefix is not None:
+            assert mode == "schoko", "checkpoints and warm starts are only supported in schoko mode"
+        
+        if progress is not None:
+            progress = Progress(progress, interval=progress_interval, engine=mode, level_id=level_id, folder=folder, budget=num_iters)
+            progress.emit("start")
+
+        # the store is keyed by the initial board kept by board(), engines may modify the board they are given
+        initial = self.boards[(folder, level_id)]
+        cached = self.store.lookup(initial) if self.store is not None else None
+        if cached is not None and self.reuse == "solution":
+            moves, stats = cached
+            if self.verify(board, moves):
+                self.print("Solution taken from the solution store", verbose)
+                self.result = Result("WIN", moves, dict(stats, cached=True))
+                if progress is not None:
+                    progress.emit("finish", outcome="WIN", length=len(moves), stats=self.result.stats)
+                return "WIN", len(moves)
+            self.store.discard(initial)
+        elif cached is not None and mode == "schoko" and prefix is None:
+            moves = cached[0]
+            prefix = moves[:min(int(len(moves) * self.prefix_fraction), len(moves) - 1)]
+
+        if mode == "portfolio":
+            from agent.portfolio import solve_portfolio
+            assert engines, "the portfolio needs at least one engine"
+            self.result = solve_portfolio(level_id, folder, engines, num_iters, board=board, engine_options=engine_options)
+            self.print(f"Solved by {self.result.stats.get('winner')}", verbose)
+        else:
+            if mode == "schoko":
+                engine = get_engine(mode, verbose=verbose, resume=resume, checkpoint=checkpoint, prefix=prefix, **(engine_options or {}))
+            else:
+                engine = get_engine(mode, verbose=verbose, **(engine_options or {}))
+            engine.progress = progress
+            self.result = engine.solve(board, num_iters)
+        
+        outcome, length = self.replay(board, self.result.moves, verbose)
+        if self.store is not None and outcome == "WIN":
+            self.store.record(initial, self.result.moves, self.result.stats)
+        if progress is not None:
+            progress.emit("finish", outcome=outcome, length=length, stats=self.result.stats)
+        return outcome, length
+    
+    # returns a copy of the initial board of the level, the level and its deadlock file are loaded on the first call (the
+    # deadlocks are computed first if the file is missing or the level is a custom one) and kept for later searches
+    def board(self, level_id, folder):
+        key = (folder, level_id)
+        if key not in self.boards:
+            file_path = "deadlock_detection/"+folder+"level_"+str(level_id)+".npy"
+            # the deadlock precomputation is only imported when it is needed
+            if not os.path.isfile(file_path) or not (folder in ["Microban/", "CBC/"]):
+                from deadlock_detection.precompute_deadlocks import compute_deadlocks
+                compute_deadlocks(level_id, folder, verbose=0)
+            self.boards[key] = Sokoban.SokobanBoard(level_id=level_id, folder=folder)
+        return self.boards[key].copy()
+
+    # checks that the moves (e.g. of a stored solution) are valid pushes from the board and solve it
+    def verify(self, board, moves):
+        for move in moves:
+            if tuple(move) not in board.valid_moves():
+                return False
+            board = board.move(*move)
+        return board.solved()
+
+    # replays the moves of a solution, the boards are only printed at verbose 3
+    # only the type of the reward is needed, so the matching (and scipy) is skipped
+    def replay(self, board, moves, verbose):
         if not moves is None:
             for move in moves:
                 board = board.move(*move)
-                if board.reward().get_type() != "STEP":  
+                outcome = "WIN" if board.solved() else "LOSS" if check_deadlock(board) else "STEP"
+                if outcome != "STEP":  
                     self.print("==========", verbose)
                     self.print(board, verbose)
-                    self.print(board.reward().get_type(), verbose)
-                    outcome = board.reward().get_type()
+                    self.print(outcome, verbose)
                     if outcome == "WIN":
                         assert len(board.find_elements(Sokoban.Elements.BOX.value)) == 0       
-                    return board.reward().get_type(), len(moves)
+                    return outcome, len(moves)
                 self.print("==========", verbose)
                 self.print(board, verbose)
                 
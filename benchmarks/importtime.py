@@ -0,0 +1,86 @@
+import re
+import json
+import time
+import statistics
+import subprocess
+import argparse
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.resources import git_commit
+
+# start-up cost of the solver: the cumulative import time of the main modules (python -X importtime, every import in a
+# fresh interpreter) and the wall time of a complete demo.py run on a small level
+# results can be saved as JSON and compared against a saved run (e.g. of an older commit)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["game.Sokoban", "agent.engine", "agent.sokoban_solver"]
+COMMAND = ["demo.py", "--folder=CBC/", "--level_id=1", "--mode=bfs", "--verbose=0"]
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+# cumulative import time in ms of the module and the slowest modules it imports (top level entries of the import tree)
+def import_time(module):
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, capture_output=True,
+                            text=True, check=True).stderr
+    entries = [LINE.match(line) for line in output.splitlines()]
+    entries = [(match.group(4), int(match.group(2)) / 1000, len(match.group(3))) for match in entries if match]
+    position = next(i for i, (name, _, _) in enumerate(entries) if name == module)
+    _, total, top = entries[position]
+    # a module is listed after its imports, its subtree is the run of deeper entries directly before it (the imports of
+    # the interpreter start-up come earlier), the children are indented by two more spaces
+    children = {}
+    for name, cumulative, depth in reversed(entries[:position]):
+        if depth <= top:
+            break
+        if depth == top + 2:
+            children[name] = cumulative
+    return total, children
+
+def command_time(command):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + command, cwd=ROOT, capture_output=True, check=True)
+    return 1000 * (time.perf_counter() - start)
+
+def run(repeat=5, verbose=0):
+    results = {}
+    for module in MODULES:
+        times = []
+        heaviest = {}
+        for _ in range(repeat):
+            total, imported = import_time(module)
+            times.append(total)
+            heaviest = imported
+        results[module] = {"median_ms": statistics.median(times), "min_ms": min(times),
+                           "heaviest": dict(sorted(heaviest.items(), key=lambda item: -item[1])[:5])}
+    times = [command_time(COMMAND) for _ in range(repeat)]
+    results[" ".join(COMMAND)] = {"median_ms": statistics.median(times), "min_ms": min(times)}
+    if verbose:
+        for name, result in results.items():
+            print(f"{name:<60} {result['median_ms']:>9.1f} ms (min {result['min_ms']:.1f})")
+            for imported, cumulative in result.get("heaviest", {}).items():
+                print(f"    {imported:<56} {cumulative:>9.1f} ms")
+    return {"meta": {"commit": git_commit(), "python": sys.version.split()[0], "repeat": repeat}, "results": results}
+
+def compare(baseline, current):
+    print(f"{'':<60} {'baseline':>9} {'current':>9} {'change':>8}")
+    for name, result in current["results"].items():
+        if name in baseline["results"]:
+            before = baseline["results"][name]["median_ms"]
+            print(f"{name:<60} {before:>9.1f} {result['median_ms']:>9.1f} {result['median_ms'] / before - 1:>+8.1%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Import and start-up time of the solver')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per measurement')
+    parser.add_argument('--save', type=str, default=None, help='file the results are saved to (JSON)')
+    parser.add_argument('--baseline', type=str, default=None, help='saved results the current ones are compared against')
+    args = parser.parse_args()
+    current = run(repeat=args.repeat, verbose=1)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        compare(baseline, current)
@@ -0,0 +1,184 @@
+import time
+import json
+import platform
+import statistics
+import argparse
+import numpy as np
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import game.Sokoban as Sokoban
+from agent.engine import get_engine
+from deadlock_detection.detect_deadlocks import check_deadlock
+from reward_functions.min_cost_matching import min_cost_matching
+from utils.resources import git_commit
+
+# microbenchmarks of the hot paths of the game and the deadlock detection
+# the workload are the states of recorded solutions of real levels together with all their children (so dead and
+# deadlocked states are included), every benchmark calls one function on every state of the workload
+# a run does warmup passes over the workload and then times repeat passes, the reported ops/sec are per pass
+# results can be saved as JSON baselines and two baselines compared, a benchmark whose median ops/sec dropped by more than
+# the threshold is flagged as a regression
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+# levels recorded by default, (folder, level_id)
+LEVELS = [("Microban/", 2), ("Microban/", 4), ("Microban/", 8), ("Microban/", 16), ("Microban/", 19), ("Microban/", 26),
+          ("CBC/", 5), ("CBC/", 10), ("CBC/", 15), ("CBC/", 20)]
+
+def recording_path(folder, level_id):
+    return os.path.join(RECORDINGS, folder.strip("/") + "_level_" + str(level_id) + ".txt")
+
+# solves the level with the breadth first search and writes the solution, one move "x y dx dy" per line (the format of
+# demo.py --prefix)
+def record(folder, level_id, budget, verbose=0):
+    board = Sokoban.SokobanBoard(level_id=level_id, folder=folder)
+    result = get_engine("bfs").solve(board, budget)
+    if result.moves is None:
+        if verbose:
+            print(f"{folder}level_{level_id}: not solved within {budget} expanded states, skipped")
+        return None
+    os.makedirs(RECORDINGS, exist_ok=True)
+    path = recording_path(folder, level_id)
+    with open(path, "w") as f:
+        for move in result.moves:
+            f.write(" ".join(str(int(x)) for x in move) + "\n")
+    if verbose:
+        print(f"{folder}level_{level_id}: {len(result.moves)} pushes written to {path}")
+    return path
+
+# returns the boards along the recorded solution of a level and all their children
+def load_states(folder, level_id):
+    with open(recording_path(folder, level_id)) as f:
+        moves = [tuple(int(x) for x in line.split()) for line in f if line.strip()]
+    board = Sokoban.SokobanBoard(level_id=level_id, folder=folder)
+    states = [board]
+    for move in moves:
+        board = board.move(*move)
+        states.append(board)
+    children = []
+    for state in states:
+        children += state.successors(state.valid_moves())
+    return states + children
+
+# recorded levels available, in the order of LEVELS followed by any other recordings
+def recorded_levels():
+    levels = [(folder, level_id) for folder, level_id in LEVELS if os.path.isfile(recording_path(folder, level_id))]
+    if os.path.isdir(RECORDINGS):
+        for file in sorted(os.listdir(RECORDINGS)):
+            folder, level_id = file[:-len(".txt")].split("_level_")
+            if (folder + "/", int(level_id)) not in levels:
+                levels.append((folder + "/", int(level_id)))
+    return levels
+
+# benchmarks by name, each one maps the workload to a list of calls and the function called on each of them
+def move_calls(states):
+    return [(state, move) for state in states for move in state.valid_moves()]
+
+BENCHMARKS = {
+    "move": (move_calls, lambda call: call[0].move(*call[1])),
+    "successors": (lambda states: states, lambda state: state.successors(state.valid_moves())),
+    "valid_moves": (lambda states: states, lambda state: state.valid_moves()),
+    "find_interior": (lambda states: states, lambda state: state.find_interior(*state.player)),
+    "reward": (lambda states: states, lambda state: state.reward()),
+    "min_cost_matching": (lambda states: states, min_cost_matching),
+    "check_deadlock": (lambda states: states, check_deadlock),
+}
+
+# times one benchmark, returns its statistics
+def measure(calls, function, warmup, repeat):
+    for _ in range(warmup):
+        for call in calls:
+            function(call)
+    rates = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for call in calls:
+            function(call)
+        rates.append(len(calls) / (time.perf_counter() - start))
+    return {"calls": len(calls), "repeat": repeat, "median": statistics.median(rates), "mean": statistics.mean(rates),
+            "stdev": statistics.stdev(rates) if repeat > 1 else 0.0, "min": min(rates), "max": max(rates)}
+
+def run(names, warmup=2, repeat=5, verbose=0):
+    levels = recorded_levels()
+    assert levels, "no recordings found, run the record command first"
+    states = []
+    for folder, level_id in levels:
+        states += load_states(folder, level_id)
+    results = {}
+    for name in names:
+        make_calls, function = BENCHMARKS[name]
+        results[name] = measure(make_calls(states), function, warmup, repeat)
+        if verbose:
+            stats = results[name]
+            print(f"{name:<18} {stats['median']:>12.0f} ops/sec (mean {stats['mean']:.0f}, stdev {stats['stdev']:.0f}, "
+                  f"{stats['calls']} calls x {repeat})")
+    meta = {"commit": git_commit(), "date": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "machine": platform.machine(), "platform": platform.platform(),
+            "levels": [folder + "level_" + str(level_id) for folder, level_id in levels], "states": len(states),
+            "warmup": warmup}
+    return {"meta": meta, "results": results}
+
+# compares the median ops/sec of two baselines, returns the names of the benchmarks that got slower by more than threshold
+def compare(baseline, current, threshold=0.1):
+    regressions = []
+    print(f"{'benchmark':<18} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, stats in current["results"].items():
+        if name not in baseline["results"]:
+            print(f"{name:<18} {'-':>12} {stats['median']:>12.0f} {'-':>8}")
+            continue
+        before = baseline["results"][name]["median"]
+        change = stats["median"] / before - 1
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<18} {before:>12.0f} {stats['median']:>12.0f} {change:>+8.1%}{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Microbenchmarks of the game and deadlock detection hot paths')
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="record the solutions the benchmarks replay")
+    record_parser.add_argument('--folder', type=str, default=None, help='foldername, all default levels if not given')
+    record_parser.add_argument('--level_id', type=int, default=None, help='level id (together with --folder)')
+    record_parser.add_argument('--num_iters', type=int, default=200000, help='budget of the breadth first search')
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument('--benchmarks', type=str, default=",".join(BENCHMARKS), help='comma separated benchmarks')
+    run_parser.add_argument('--warmup', type=int, default=2, help='untimed passes over the workload')
+    run_parser.add_argument('--repeat', type=int, default=5, help='timed passes over the workload')
+    run_parser.add_argument('--save', type=str, default=None, help='file the results are saved to (JSON baseline)')
+    run_parser.add_argument('--baseline', type=str, default=None, help='baseline the results are compared against')
+    run_parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown flagged as a regression')
+    compare_parser = commands.add_parser("compare", help="compare two saved results")
+    compare_parser.add_argument('baseline', type=str, help='JSON baseline')
+    compare_parser.add_argument('current', type=str, help='JSON results compared against the baseline')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown flagged as a regression')
+    args = parser.parse_args()
+
+    if args.command == "record":
+        levels = LEVELS if args.folder is None else [(args.folder, args.level_id)]
+        for folder, level_id in levels:
+            record(folder, level_id, args.num_iters, verbose=1)
+    elif args.command == "run":
+        names = args.benchmarks.split(",")
+        for name in names:
+            assert name in BENCHMARKS, f"unknown benchmark {name}, available benchmarks: {', '.join(BENCHMARKS)}"
+        current = run(names, warmup=args.warmup, repeat=args.repeat, verbose=1)
+        if args.save:
+            directory = os.path.dirname(args.save)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(args.save, "w") as f:
+                json.dump(current, f, indent=2)
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            print()
+            sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
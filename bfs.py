@@ -1,44 +1,42 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from deadlock_detection.detect_deadlocks import check_deadlock
 import game.Sokoban as Sokoban
+from agent.bfs import bfs
+from agent.external_bfs import external_bfs
+from agent.parallel_bfs import parallel_bfs
 import argparse
 
 parser = argparse.ArgumentParser(description='Sokoban Solver', allow_abbrev=False)
 parser.add_argument('--level_id', type=int, required=True, help='Level ID')
 parser.add_argument('--folder', type=str, default="Microban/", help='foldername')
-parser.add_argument('--num_iters', type=int, default=100000, help='Number of simulations in the MCTS')
+parser.add_argument('--num_iters', type=int, default=100000, help='Maximum number of expanded states (stored states with --external)')
 parser.add_argument('--verbose', type=int, default=1, help='0 for no output, value between 0 and 3')
+parser.add_argument('--external', action='store_true', help='keep the frontier and visited set on disk')
+parser.add_argument('--exhaustive', action='store_true', help='with --external: search the whole state space instead of stopping at the first solution')
+parser.add_argument('--workdir', type=str, default=None, help='with --external: directory for the on disk layers, a temporary directory if not given')
+parser.add_argument('--workers', type=int, default=None, help='search with this many worker processes, the states are partitioned by their zobrist key')
 args = parser.parse_args()
 
 board = Sokoban.SokobanBoard(level_id=args.level_id, folder=args.folder)
-visited = set()
-queue = [(board, [])]
-num_iters = 0
-num_states = 1
-win=False
-while queue and num_iters < args.num_iters and not win:
-    current_board, current_path = queue.pop(0)
-    for action in current_board.valid_moves():
-        new_board = current_board.move(*action)
-        if new_board not in visited:
-            visited.add(new_board)
-        if new_board.reward().get_type() == "WIN":
-            if args.verbose==3:
-                print("\n")
-                board = Sokoban.SokobanBoard(level_id=args.level_id, folder=args.folder)
-                print(board)
-                for action in current_path + [action]:
-                    board = board.move(*action)
-                    print(board)
-            print("WIN")
-            win=True
-            break
-            
-        if not check_deadlock(new_board):
-            queue.append((new_board, current_path + [action]))
-                
-    if args.verbose>=2:
-        print(f"Iteration: {num_iters}, number of states: {len(visited)}", end="\r")
-    num_iters += 1
\ No newline at end of file
+stats = {}
+if args.external:
+    moves = external_bfs(board, args.num_iters, workdir=args.workdir, exhaustive=args.exhaustive, verbose=args.verbose, stats=stats)
+elif args.workers is not None:
+    moves = parallel_bfs(board, args.num_iters, num_workers=args.workers, verbose=args.verbose, stats=stats)
+else:
+    moves = bfs(board, args.num_iters, verbose=args.verbose, stats=stats)
+if moves is not None:
+    if args.verbose==3:
+        print("\n")
+        print(board)
+        for action in moves:
+            board = board.move(*action)
+            print(board)
+    print(f"WIN, Solution Length: {len(moves)}")
+else:
+    print("LOSS")
+if args.verbose:
+    print(f"{stats['generated']} states generated, {stats['states']} states stored, {stats['states_per_sec']:.0f} states/sec, peak memory {stats['peak_rss_mb']:.0f} MB")
+    if args.external:
+        print(f"States per layer: {stats['layers']}, {stats['disk_bytes']} bytes on disk")
@@ -1,7 +1,4 @@
-import sys
-import os
 import numpy as np
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from game.GameElements import Elements
 
 def check_deadlock(board):
@@ -20,6 +17,24 @@ def check_deadlock(board):
     # TODO: add kernels that check for deadlocks
     return False
 
+# checks if pushing the box at box onto target freezes it in a 2x2 block of walls and boxes, which is a deadlock unless all
+# boxes of the block are on goals, the board is the state before the push, used during move generation
+def frozen_push(board, box, target):
+    x, y = target
+    for dx, dy in [(-1, -1), (-1, 1), (1, -1), (1, 1)]:
+        # the target can be the square of the player
+        off_goal = board.level[target] not in [Elements.GOAL.value, Elements.PLAYER_ON_GOAL.value]
+        blocked = True
+        for square in [(x + dx, y), (x, y + dy), (x + dx, y + dy)]:
+            tile = board.level[square]
+            if square == box or tile not in [Elements.WALL.value, Elements.BOX.value, Elements.BOX_ON_GOAL.value]:
+                blocked = False
+                break
+            off_goal = off_goal or tile == Elements.BOX.value
+        if blocked and off_goal:
+            return True
+    return False
+
 # checks if a box is in one of the precomputed deadlocks
 def precomputed_deadlock(board):
     for box in board.find_elements([Elements.BOX.value]):
@@ -1,7 +1,10 @@
 import sys
 import os
 import numpy as np
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# run as a script (python deadlock_detection/precompute_deadlocks.py) the packages are found from the repository root,
+# imported as a module of the package (or installed) the path is left as it is
+if not __package__:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from game.GameElements import Elements, char_to_element
 from game.ReverseSokoban import ReverseSokobanBoard
 from queue import Queue
@@ -103,7 +106,8 @@ def compute_deadlocks(level_id, path, verbose=0):
     return
 
 
-if __name__ == "__main__":
+# command line entry point, also installed as the schokoban-precompute-deadlocks script (see pyproject.toml)
+def main():
     parser = argparse.ArgumentParser(description='Sokoban Solver')
     parser.add_argument('--folder', type=str, default="Microban/", help='foldername')
     parser.add_argument('--level_id', type=int, default=-1, help='level id, if -1 then all levels are computed')
@@ -116,4 +120,7 @@ if __name__ == "__main__":
         compute_deadlocks(args.level_id, args.folder, verbose=0)
     else:
         for i in range(1, NUM_LEVELS+1):
-            compute_deadlocks(i, args.folder, verbose=0)
\ No newline at end of file
+            compute_deadlocks(i, args.folder, verbose=0)
+
+if __name__ == "__main__":
+    main()
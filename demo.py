@@ -2,6 +2,8 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import agent.sokoban_solver as sokoban_solver
+from agent.engine import ENGINES, accepted_options
+from utils.progress import get_consumer
 import argparse
 import random
 
@@ -12,15 +14,70 @@ parser.add_argument('--level_id', type=int, required=True, help='Level ID')
 parser.add_argument('--folder', type=str, default="Microban/", help='foldername')
 parser.add_argument('--num_iters', type=int, default=100000, help='Number of simulations in the MCTS')
 parser.add_argument('--verbose', type=int, default=1, help='0 for no output, value between 0 and 3')
-parser.add_argument('--mode', type=str, default="schoko", help='schoko for using schokoban, vanilla for using vanilla mcts')
+parser.add_argument('--mode', type=str, default="schoko", help=f'search engine, one of {", ".join(ENGINES)} (see README.md), or portfolio to race the engines given by --engines')
+parser.add_argument('--engines', type=str, default="schoko,vanilla,bfs", help='comma separated engines raced in portfolio mode')
 parser.add_argument('--seed', type=int, default=None, help='Random Seed')
+parser.add_argument('--weight', type=float, default=1.0, help='heuristic weight of astar, 1 gives push optimal solutions (without --macros), larger values are faster')
+parser.add_argument('--heuristic', type=str, default="min_cost_matching", help='heuristic used by astar')
+parser.add_argument('--checkpoint', type=str, default=None, help='file the search tree is saved to after the run (.npz)')
+parser.add_argument('--resume', type=str, default=None, help='checkpoint to resume the search from, --num_iters is the total budget')
+parser.add_argument('--prefix', type=str, default=None, help='file with one move "x y dx dy" per line used to warm start the search')
+parser.add_argument('--endgame', type=str, default=None, help='endgame database (see agent/endgame.py) probed by schoko, bfs, astar and idastar')
+parser.add_argument('--macros', action='store_true', help='push boxes through tunnels in one move (schoko, vanilla, bfs and astar)')
+parser.add_argument('--goal_rooms', action='store_true', help='with --macros: push boxes entering a goal room on to their goal')
+parser.add_argument('--prior', type=float, default=0, help='schoko: weight of the prior term (PUCT) in the selection, 0 to turn it off')
+parser.add_argument('--widening', type=float, default=0, help='schoko: progressive widening, a node visited n times considers ceil(widening * sqrt(n)) children, 0 to turn it off')
+parser.add_argument('--optimize', action='store_true', help='schoko and vanilla: shorten the solution found with local searches along it')
+parser.add_argument('--profile', type=str, default=None, help='schoko: write the time spent per phase of the search to this file (JSON), or a cProfile trace for .prof files')
+parser.add_argument('--progress', type=str, default=None, help='progress events: console, bar or jsonl:<path>, a status line at verbose 1 if not given')
+parser.add_argument('--progress_interval', type=float, default=0.5, help='minimal time in seconds between two progress events')
+parser.add_argument('--store', type=str, default=None, help='solution store (SQLite) looked up before the search and updated with the solution found')
+parser.add_argument('--store_reuse', type=str, default="solution", help='solution: return a stored solution without searching, prefix: warm start schoko with its beginning')
+parser.add_argument('--store_prefix', type=float, default=0.5, help='with --store_reuse=prefix: fraction of the stored solution used as prefix')
 args = parser.parse_args()
 
 if args.seed:
     random.seed(args.seed)
 
-solver = sokoban_solver.Solver()
-outcome, sol_length = solver.solve(args.level_id, args.folder, args.num_iters, args.verbose, args.mode)
+prefix = None
+if args.prefix:
+    with open(args.prefix) as f:
+        prefix = [tuple(int(x) for x in line.split()) for line in f if line.strip()]
+
+engine_options = {}
+if args.mode == "astar":
+    engine_options.update(weight=args.weight, heuristic=args.heuristic)
+if args.endgame:
+    engine_options["endgame"] = args.endgame
+if args.macros:
+    engine_options["macros"] = True
+    if args.goal_rooms:
+        engine_options["goal_rooms"] = True
+if args.prior:
+    engine_options["prior"] = args.prior
+if args.widening:
+    engine_options["widening"] = args.widening
+if args.optimize:
+    engine_options["optimize"] = True
+if args.profile:
+    engine_options["profile"] = args.profile
+# an option the engine does not take is an error of the command line, in portfolio mode every engine gets the ones it takes
+if args.mode != "portfolio":
+    if args.mode not in ENGINES:
+        parser.error(f"unknown mode {args.mode}")
+    unsupported = sorted(set(engine_options) - accepted_options(args.mode))
+    if unsupported:
+        parser.error(f"--mode={args.mode} does not support " + ", ".join("--" + option for option in unsupported))
+
+store = None
+if args.store:
+    from utils.solution_store import SolutionStore
+    store = SolutionStore(args.store)
+
+solver = sokoban_solver.Solver(store=store, reuse=args.store_reuse, prefix_fraction=args.store_prefix)
+outcome, sol_length = solver.solve(args.level_id, args.folder, args.num_iters, args.verbose, args.mode, resume=args.resume, checkpoint=args.checkpoint, prefix=prefix, engines=args.engines.split(","),
+                                   engine_options=engine_options or None, progress=get_consumer(args.progress) if args.progress else None,
+                                   progress_interval=args.progress_interval)
 print("                                                                            ", end="\r")
 if outcome == "WIN":
     print(f"Level {args.level_id}: {outcome}, Solution Length: {sol_length}.")
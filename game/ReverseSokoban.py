@@ -2,9 +2,6 @@ from enum import Enum
 import numpy as np
 from queue import Queue
 
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from game.GameElements import Elements, char_to_element, element_to_char
 
 class ReverseSokobanBoard:
@@ -176,7 +173,10 @@ class ReverseSokobanBoard:
         return new_board
 
     def construct(self, level, player, steps):
-        new_board = ReverseSokobanBoard(level_id=self.level_id, folder=self.folder)
+        # the level is replaced anyway, so there is no need to load the level file again
+        new_board = ReverseSokobanBoard.__new__(ReverseSokobanBoard)
+        new_board.level_id = self.level_id
+        new_board.folder = self.folder
         new_board.level = level
         new_board.player = player
         new_board.steps = steps
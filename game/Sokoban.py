@@ -3,13 +3,10 @@ import numpy as np
 from queue import Queue
 from copy import deepcopy
 
-import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from reward_functions.min_cost_matching import min_cost_matching
 from game.GameElements import Elements, char_to_element, element_to_char
-from deadlock_detection.detect_deadlocks import check_deadlock
-from deadlock_detection.precompute_deadlocks import compute_deadlocks
+from deadlock_detection.detect_deadlocks import check_deadlock, frozen_push
 from game.reward import Reward
 
 # used for visualization    
@@ -54,12 +51,27 @@ class SokobanBoard:
         self.hash = self.get_hash()
         
         self.deadlocks = deadlocks
+        # macro pushes (game.macros.MacroLayer) applied by move() and successors(), None for single pushes only
+        self.macros = None
         
         if self.deadlocks is None:
             file_path = "deadlock_detection/"+folder+"level_"+str(level_id)+".npy"
             assert os.path.isfile(file_path), "deadlock file not found"
             self.deadlocks = np.load(file_path)
     
+    # board of an already loaded level (e.g. views of a shared file, see game.shared), no files are read
+    # the level is copied as pushes modify it, the deadlocks are shared
+    @classmethod
+    def from_arrays(cls, level, deadlocks, level_id=None, folder=None):
+        board = cls.__new__(cls)
+        board.folder = folder
+        board.level_id = level_id
+        board.deadlocks = deadlocks
+        board.macros = None
+        board.level = level
+        player = board.find_elements([Elements.PLAYER.value, Elements.PLAYER_ON_GOAL.value])[0]
+        return board.construct(level.copy(), player, 0)
+
     def get_hash(self):
         return str(self.interior) + str(self.box_positions)
     
@@ -107,23 +119,23 @@ class SokobanBoard:
     def is_valid_move(self, x, y):
         return 0 <= x < self.level.shape[0] and 0 <= y < self.level.shape[1]
 
+    # pushes onto precomputed dead squares and pushes that freeze a box (see frozen_push) are not generated, so these
+    # children are never built, interior and box_positions are kept up to date by construct() and push()
     def valid_moves(self):
-        box_positions = self.find_elements([Elements.BOX.value, Elements.BOX_ON_GOAL.value])
-        valid_moves_ = set()
-        interior = self.find_interior(*self.player)
-        for (box_x, box_y) in box_positions:
+        interior = set(self.interior)
+        valid_moves = []
+        for (box_x, box_y) in self.box_positions:
             for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
                 player_x, player_y = box_x - dx, box_y - dy
-                if (player_x, player_y) in interior:
-                    valid_moves_.add(((player_x, player_y), (dx, dy), (box_x, box_y)))
-        
-        valid_moves = set()
-        for player_pos, d, box_pos in valid_moves_:
-            adj_x, adj_y = box_pos[0] + d[0], box_pos[1] + d[1]
-            if not self.level[adj_x, adj_y] in [Elements.BOX.value, Elements.BOX_ON_GOAL.value, Elements.WALL.value]:
-                valid_moves.add((*player_pos, *d))
-       
-        return list(valid_moves)
+                if (player_x, player_y) not in interior:
+                    continue
+                target = (box_x + dx, box_y + dy)
+                if self.level[target] in [Elements.BOX.value, Elements.BOX_ON_GOAL.value, Elements.WALL.value]:
+                    continue
+                if self.deadlocks[target] == 0 or frozen_push(self, (box_x, box_y), target):
+                    continue
+                valid_moves.append((player_x, player_y, dx, dy))
+        return valid_moves
 
     def move(self, player_x, player_y, dx, dy):
         NUM_BOXES = len(self.find_elements([Elements.BOX.value, Elements.BOX_ON_GOAL.value]))
@@ -146,6 +158,8 @@ class SokobanBoard:
         new_level[new_player_x, new_player_y] = Elements.PLAYER.value if new_level[new_player_x, new_player_y] == Elements.BOX.value else Elements.PLAYER_ON_GOAL.value
         
         new_board = self.construct(new_level, (new_player_x, new_player_y), self.steps + 1)
+        if self.macros is not None:
+            new_board, _ = self.macros.follow(new_board, dx, dy)
         
         NEW_NUM_BOXES = len(new_board.find_elements([Elements.BOX.value, Elements.BOX_ON_GOAL.value]))
         NEW_NUM_GOALS = len(new_board.find_elements([Elements.GOAL.value, Elements.BOX_ON_GOAL.value, Elements.PLAYER_ON_GOAL.value]))
@@ -154,8 +168,66 @@ class SokobanBoard:
         assert len(new_board.find_elements([Elements.PLAYER.value, Elements.PLAYER_ON_GOAL.value])) == 1
         return new_board
     
+    # pushes a box in place instead of creating a new board, returns the information needed to undo the push
+    # macros are not applied
+    # interior and box_positions are kept up to date, the string hash is not
+    def push(self, player_x, player_y, dx, dy):
+        box_x, box_y = player_x + dx, player_y + dy
+        new_box_x, new_box_y = player_x + 2*dx, player_y + 2*dy
+        undo = (self.player, self.level[self.player], (box_x, box_y), self.level[box_x, box_y], (new_box_x, new_box_y), self.level[new_box_x, new_box_y], self.box_positions, self.interior, self.steps)
+        
+        self.level[self.player] = Elements.FLOOR.value if self.level[self.player] == Elements.PLAYER.value else Elements.GOAL.value
+        assert self.level[new_box_x, new_box_y] in [Elements.PLAYER.value, Elements.PLAYER_ON_GOAL.value, Elements.FLOOR.value, Elements.GOAL.value]
+        self.level[new_box_x, new_box_y] = Elements.BOX.value if self.level[new_box_x, new_box_y] in [Elements.FLOOR.value, Elements.PLAYER.value] else Elements.BOX_ON_GOAL.value
+        assert self.level[box_x, box_y] in [Elements.BOX.value, Elements.BOX_ON_GOAL.value]
+        self.level[box_x, box_y] = Elements.PLAYER.value if self.level[box_x, box_y] == Elements.BOX.value else Elements.PLAYER_ON_GOAL.value
+        
+        self.player = (box_x, box_y)
+        self.steps += 1
+        self.box_positions = sorted([box for box in self.box_positions if box != (box_x, box_y)] + [(new_box_x, new_box_y)])
+        self.interior = sorted(self.find_interior(*self.player))
+        return undo
+    
+    # reverts a push done by push()
+    def undo(self, undo):
+        player, player_tile, box, box_tile, target, target_tile, self.box_positions, self.interior, self.steps = undo
+        self.level[target] = target_tile
+        self.level[box] = box_tile
+        self.level[player] = player_tile
+        self.player = player
+    
+    # generates the child states of all given moves in one pass, the forced pushes of macros are included
+    # the sanity checks on the number of boxes and goals done by move() are skipped, only the changed tiles are checked
+    def successors(self, moves):
+        player_tile = Elements.FLOOR.value if self.level[self.player] == Elements.PLAYER.value else Elements.GOAL.value
+        children = []
+        for player_x, player_y, dx, dy in moves:
+            new_level = self.level.copy()
+            new_level[self.player] = player_tile
+            
+            new_box_x, new_box_y = player_x + 2*dx, player_y + 2*dy
+            target = new_level[new_box_x, new_box_y]
+            assert target in [Elements.PLAYER.value, Elements.PLAYER_ON_GOAL.value, Elements.FLOOR.value, Elements.GOAL.value]
+            new_level[new_box_x, new_box_y] = Elements.BOX.value if target in [Elements.FLOOR.value, Elements.PLAYER.value] else Elements.BOX_ON_GOAL.value
+            
+            new_player_x, new_player_y = player_x + dx, player_y + dy
+            box = new_level[new_player_x, new_player_y]
+            assert box in [Elements.BOX.value, Elements.BOX_ON_GOAL.value]
+            new_level[new_player_x, new_player_y] = Elements.PLAYER.value if box == Elements.BOX.value else Elements.PLAYER_ON_GOAL.value
+            
+            child = self.construct(new_level, (new_player_x, new_player_y), self.steps + 1)
+            if self.macros is not None:
+                child, _ = self.macros.follow(child, dx, dy)
+            children.append(child)
+        return children
+    
     def construct(self, level, player, steps):
-        new_board = SokobanBoard(level_id=self.level_id, folder=self.folder, deadlocks=self.deadlocks) 
+        # the static level data is shared with the parent board, so there is no need to load the level file again
+        new_board = SokobanBoard.__new__(SokobanBoard)
+        new_board.folder = self.folder
+        new_board.level_id = self.level_id
+        new_board.deadlocks = self.deadlocks
+        new_board.macros = self.macros
         new_board.level = level
         new_board.player = player
         new_board.steps = steps
@@ -175,9 +247,13 @@ class SokobanBoard:
             level_copy[x, y] = Elements.PLAYER_ON_GOAL.value if level_copy[x, y] == Elements.GOAL.value else Elements.PLAYER.value
         print(SokobanBoard(level=level_copy, player=self.player))
         
+    # checks if all boxes are on goals
+    def solved(self):
+        return not np.any(self.level == Elements.BOX.value)
+    
     def reward(self):
         reward = -min_cost_matching(self)
-        if len(self.find_elements(Elements.BOX.value)) == 0:
+        if self.solved():
             return Reward(reward, "WIN")
         elif check_deadlock(self):
             return Reward(reward, "LOSS")
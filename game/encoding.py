@@ -0,0 +1,34 @@
+import numpy as np
+
+from game.GameElements import Elements
+
+# compact encoding of the states of a level as small integer rows that can be stored in numpy arrays
+# a row holds the index of the player square (the top left most square the player can reach) followed by the sorted
+# indices of the box squares, the squares are the non wall tiles of the level
+class StateEncoder():
+    def __init__(self, board):
+        self.board = board
+        # level without boxes and player
+        self.empty = board.level.copy()
+        self.empty[np.isin(self.empty, [Elements.BOX.value, Elements.PLAYER.value])] = Elements.FLOOR.value
+        self.empty[np.isin(self.empty, [Elements.BOX_ON_GOAL.value, Elements.PLAYER_ON_GOAL.value])] = Elements.GOAL.value
+        self.squares = list(zip(*np.where(self.empty != Elements.WALL.value)))
+        self.index = {square: i for i, square in enumerate(self.squares)}
+        self.dtype = np.uint8 if len(self.squares) < 2**8 else np.uint16
+        self.width = 1 + len(board.box_positions)
+
+    def encode(self, board):
+        return [self.index[board.interior[0]]] + [self.index[box] for box in board.box_positions]
+
+    # encodes several boards into one array with a row per board
+    def encode_all(self, boards):
+        return np.array([self.encode(board) for board in boards], dtype=self.dtype).reshape(-1, self.width)
+
+    def decode(self, row, steps=0):
+        level = self.empty.copy()
+        for i in row[1:]:
+            box = self.squares[i]
+            level[box] = Elements.BOX.value if level[box] == Elements.FLOOR.value else Elements.BOX_ON_GOAL.value
+        player = self.squares[row[0]]
+        level[player] = Elements.PLAYER.value if level[player] == Elements.FLOOR.value else Elements.PLAYER_ON_GOAL.value
+        return self.board.construct(level, player, steps)
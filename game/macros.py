@@ -0,0 +1,225 @@
+import numpy as np
+from collections import deque
+
+from game.GameElements import Elements
+
+DIRECTIONS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+FREE = [Elements.FLOOR.value, Elements.GOAL.value]
+GOALS = [Elements.GOAL.value, Elements.BOX_ON_GOAL.value, Elements.PLAYER_ON_GOAL.value]
+
+# squares whose removal disconnects the floor (articulation points of the grid graph of the non wall squares)
+def articulation_squares(floor):
+    squares = list(zip(*np.where(floor)))
+    order = {}
+    low = {}
+    articulation = set()
+    for root in squares:
+        if root in order:
+            continue
+        order[root] = low[root] = len(order)
+        root_children = 0
+        # iterative depth first search, the stack holds (square, parent, remaining neighbours)
+        stack = [(root, None, iter(DIRECTIONS))]
+        while stack:
+            square, parent, neighbours = stack[-1]
+            for dx, dy in neighbours:
+                neighbour = (square[0] + dx, square[1] + dy)
+                if not floor[neighbour] or neighbour == parent:
+                    continue
+                if neighbour in order:
+                    low[square] = min(low[square], order[neighbour])
+                else:
+                    order[neighbour] = low[neighbour] = len(order)
+                    stack.append((neighbour, square, iter(DIRECTIONS)))
+                    break
+            else:
+                stack.pop()
+                if parent is None:
+                    continue
+                low[parent] = min(low[parent], low[square])
+                if parent == root:
+                    root_children += 1
+                elif low[square] >= order[parent]:
+                    articulation.add(parent)
+        if root_children > 1:
+            articulation.add(root)
+    return articulation
+
+# connected components of the floor without the given square
+def components_without(floor, square):
+    seen = {square}
+    components = []
+    for dx, dy in DIRECTIONS:
+        start = (square[0] + dx, square[1] + dy)
+        if not floor[start] or start in seen:
+            continue
+        component = {start}
+        seen.add(start)
+        queue = deque([start])
+        while queue:
+            x, y = queue.popleft()
+            for ddx, ddy in DIRECTIONS:
+                neighbour = (x + ddx, y + ddy)
+                if floor[neighbour] and neighbour not in seen:
+                    seen.add(neighbour)
+                    component.add(neighbour)
+                    queue.append(neighbour)
+        components.append(component)
+    return components
+
+# macro pushes of a level, precomputed from the walls and goals only and shared by all boards of a search
+# tunnel macro: as long as the box and the player behind it are inside a one square wide tunnel (walls on both sides
+# perpendicular to the push), the box is pushed on, it can't be pushed sideways and leaving it inside only blocks the tunnel
+# the macro ends as soon as the box leaves the tunnel or reaches a goal
+# goal room macro (optional): a goal room is an area with goals that is only connected to the rest of the level through one
+# articulation square (its entrance), a box pushed onto the entrance is pushed on to the free goal of the room that is the
+# furthest away from the entrance, so rooms are filled from the back
+# the pushes following a push are a function of the state, so a macro is identified by its first push and expanded again
+# into primitive pushes with expand()
+class MacroLayer():
+    def __init__(self, board, goal_rooms=False):
+        level = board.level
+        self.deadlocks = board.deadlocks
+        padded = np.pad(level, 1, constant_values=Elements.WALL.value)
+        walls = padded == Elements.WALL.value
+        # tunnels[(dx, dy)][x, y]: square (x, y) has walls on both sides perpendicular to the direction (dx, dy)
+        self.tunnels = {}
+        for dx, dy in DIRECTIONS:
+            left = walls[1 + dy:walls.shape[0] - 1 + dy, 1 + dx:walls.shape[1] - 1 + dx]
+            right = walls[1 - dy:walls.shape[0] - 1 - dy, 1 - dx:walls.shape[1] - 1 - dx]
+            self.tunnels[(dx, dy)] = (left & right).tolist()
+        # rooms[entrance] = (squares of the room, free targets ordered by decreasing distance from the entrance)
+        self.rooms = {}
+        if goal_rooms:
+            self.find_rooms(board)
+
+    def find_rooms(self, board):
+        level = board.level
+        floor = np.pad(level != Elements.WALL.value, 1, constant_values=False)
+        goals = set(zip(*np.where(np.isin(level, GOALS))))
+        boxes = set(zip(*np.where(level == Elements.BOX.value)))
+        candidates = []
+        for entrance in articulation_squares(floor):
+            for component in components_without(floor, entrance):
+                room = {(x - 1, y - 1) for x, y in component}
+                if room & goals and not room & boxes and board.player not in room:
+                    candidates.append((len(room), (entrance[0] - 1, entrance[1] - 1), room))
+        # rooms in rooms are covered by the largest one, its entrance is reached first
+        taken = set()
+        for _, entrance, room in sorted(candidates, key=lambda candidate: -candidate[0]):
+            if room & taken:
+                continue
+            taken |= room
+            distance = self.distances(level, entrance, room)
+            targets = sorted((goal for goal in room & goals if goal in distance), key=lambda goal: -distance[goal])
+            self.rooms[entrance] = (room, targets)
+
+    # distances from the entrance to the squares of the room
+    def distances(self, level, entrance, room):
+        distance = {entrance: 0}
+        queue = deque([entrance])
+        while queue:
+            x, y = queue.popleft()
+            for dx, dy in DIRECTIONS:
+                neighbour = (x + dx, y + dy)
+                if neighbour in room and neighbour not in distance:
+                    distance[neighbour] = distance[(x, y)] + 1
+                    queue.append(neighbour)
+        return distance
+
+    # returns the board after the pushes forced by the push (dx, dy) that led to it and the list of these pushes
+    # the given board is not modified
+    def follow(self, board, dx, dy):
+        pushes = []
+        tunnel = self.tunnels[(dx, dy)]
+        while True:
+            x, y = board.player
+            box_x, box_y = x + dx, y + dy
+            new_box_x, new_box_y = box_x + dx, box_y + dy
+            if not (tunnel[x][y] and tunnel[box_x][box_y]) or board.level[box_x, box_y] != Elements.BOX.value:
+                break
+            if board.level[new_box_x, new_box_y] not in FREE or self.deadlocks[new_box_x, new_box_y] == 0:
+                break
+            if not pushes:
+                board = board.copy()
+            board.push(x, y, dx, dy)
+            pushes.append((x, y, dx, dy))
+        if self.rooms:
+            room_pushes = self.enter_room(board, dx, dy)
+            if room_pushes:
+                if not pushes:
+                    board = board.copy()
+                for push in room_pushes:
+                    board.push(*push)
+                pushes += room_pushes
+        if pushes:
+            board.hash = board.get_hash()
+        return board, pushes
+
+    # pushes moving a box that was just pushed onto the entrance of a goal room to the target of the room, None if there
+    # is no such box or the target can't be reached
+    def enter_room(self, board, dx, dy):
+        box = (board.player[0] + dx, board.player[1] + dy)
+        if box not in self.rooms or board.level[box] != Elements.BOX.value:
+            return None
+        room, targets = self.rooms[box]
+        if (box[0] + dx, box[1] + dy) not in room:
+            return None
+        target = next((goal for goal in targets if board.level[goal] == Elements.GOAL.value), None)
+        if target is None:
+            return None
+        return self.box_path(board, box, target, room)
+
+    # breadth first search over the pushes of a single box inside a room, the other boxes are not moved
+    def box_path(self, board, box, target, room):
+        level = board.level
+        blocked = lambda square: level[square] == Elements.WALL.value or (level[square] in [Elements.BOX.value, Elements.BOX_ON_GOAL.value] and square != box)
+
+        def reachable(player, box_position):
+            seen = {player}
+            queue = deque([player])
+            while queue:
+                x, y = queue.popleft()
+                for dx, dy in DIRECTIONS:
+                    neighbour = (x + dx, y + dy)
+                    if neighbour not in seen and neighbour != box_position and not blocked(neighbour):
+                        seen.add(neighbour)
+                        queue.append(neighbour)
+            return seen
+
+        player = board.player
+        start = (box, min(reachable(player, box)))
+        parents = {start: None}
+        queue = deque([(box, player)])
+        while queue:
+            box_position, player = queue.popleft()
+            area = reachable(player, box_position)
+            for dx, dy in DIRECTIONS:
+                behind = (box_position[0] - dx, box_position[1] - dy)
+                ahead = (box_position[0] + dx, box_position[1] + dy)
+                if behind not in area or ahead not in room or blocked(ahead):
+                    continue
+                if ahead != target and self.deadlocks[ahead] == 0:
+                    continue
+                state = (ahead, min(reachable(box_position, ahead)))
+                if state in parents:
+                    continue
+                parents[state] = ((box_position, min(area)), (*behind, dx, dy))
+                if ahead == target:
+                    pushes = []
+                    while parents[state] is not None:
+                        state, push = parents[state]
+                        pushes.append(push)
+                    return pushes[::-1]
+                queue.append((ahead, box_position))
+        return None
+
+    # expands macro moves found by a search from the given board back into primitive pushes
+    def expand(self, board, moves):
+        pushes = []
+        for move in moves:
+            board = board.copy()
+            board.push(*move)
+            board, forced = self.follow(board, move[2], move[3])
+            pushes += [tuple(move)] + forced
+        return pushes
@@ -0,0 +1,66 @@
+import os
+import mmap
+import shutil
+import tempfile
+import numpy as np
+
+from game.Sokoban import SokobanBoard
+
+# static data of a level (the initial level and the dead squares) written once to a file that the processes of a
+# multi-process search map read-only, instead of every process loading the level and deadlock files again
+# the file is placed in /dev/shm where it exists, so its pages are shared memory, a SharedLevel is small and picklable and
+# is passed to the worker processes, which build their initial board on zero-copy views of the file with board()
+# the Zobrist keys are not shared, they only depend on the shape of the level and are kept as python integers (see
+# game.zobrist), the endgame databases are memory mapped already (see agent.endgame)
+
+FIELDS = ["level", "deadlocks"]
+
+# views of the files mapped by the current process, by path
+mapped = {}
+
+class SharedLevel():
+    def __init__(self, board):
+        self.level_id = board.level_id
+        self.folder = board.folder
+        # only the creating process removes the file
+        self.owner = os.getpid()
+        self.directory = tempfile.mkdtemp(prefix="schokoban_", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        self.path = os.path.join(self.directory, "level.bin")
+        arrays = {"level": board.level, "deadlocks": board.deadlocks}
+        # (field, dtype, shape, offset) of every array, offsets are aligned to 8 bytes
+        self.layout = []
+        offset = 0
+        with open(self.path, "wb") as f:
+            for field in FIELDS:
+                array = np.ascontiguousarray(arrays[field])
+                padding = -offset % 8
+                f.write(bytes(padding))
+                offset += padding
+                self.layout.append((field, array.dtype.str, array.shape, offset))
+                f.write(array.tobytes())
+                offset += array.nbytes
+
+    # read-only arrays on the mapped file, the file is mapped once per process
+    def arrays(self):
+        if self.path not in mapped:
+            with open(self.path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            mapped[self.path] = {field: np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+                                 for field, dtype, shape, offset in self.layout}
+        return mapped[self.path]
+
+    # initial board of the level, the deadlocks are a view of the shared file and only the level is copied
+    def board(self):
+        arrays = self.arrays()
+        return SokobanBoard.from_arrays(arrays["level"], arrays["deadlocks"], level_id=self.level_id, folder=self.folder)
+
+    def close(self):
+        if os.getpid() == self.owner:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,30 @@
+import numpy as np
+
+# Zobrist hashing of Sokoban states to 64 bit integers
+# the player is represented by the top left most square it can reach, so states that only differ by player moves share a key
+# the keys only depend on the shape of the level, so they are the same in every process and for forward and reverse boards
+
+class Zobrist():
+    def __init__(self, shape, seed=0):
+        rng = np.random.default_rng(seed)
+        # python integers are faster to xor than numpy scalars
+        self.box_keys = rng.integers(0, 2**63, size=shape, dtype=np.int64).tolist()
+        self.player_keys = rng.integers(0, 2**63, size=shape, dtype=np.int64).tolist()
+
+    def key(self, player, box_positions):
+        key = self.player_keys[player[0]][player[1]]
+        for x, y in box_positions:
+            key ^= self.box_keys[x][y]
+        return key
+
+tables = {}
+
+def get_table(shape):
+    shape = tuple(int(x) for x in shape)
+    if shape not in tables:
+        tables[shape] = Zobrist(shape)
+    return tables[shape]
+
+# returns the key of a board, works for SokobanBoard and ReverseSokobanBoard (interior and box_positions are kept sorted)
+def state_key(board):
+    return get_table(board.level.shape).key(board.interior[0], board.box_positions)
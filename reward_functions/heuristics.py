@@ -0,0 +1,14 @@
+# registry of heuristics estimating the number of pushes left, used by the informed search engines
+# a heuristic takes a board and returns a number, it should never overestimate for the search to find optimal solutions
+from reward_functions.min_cost_matching import min_cost_matching
+
+HEURISTICS = {
+    "min_cost_matching": min_cost_matching,
+}
+
+def register_heuristic(name, heuristic):
+    HEURISTICS[name] = heuristic
+
+def get_heuristic(name):
+    assert name in HEURISTICS, f"unknown heuristic {name}, available heuristics: {', '.join(HEURISTICS)}"
+    return HEURISTICS[name]
@@ -1,13 +1,11 @@
 # computes the minimum cost matching of the board. distances are computed using the manhattan distance between boxes and goals.
 import numpy as np
-import sys
-import os
-from scipy.optimize import linear_sum_assignment
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from game.GameElements import Elements
 
+# scipy is imported on the first call, loading scipy.optimize dominates the start-up time of the solver
 def min_cost_matching(board):
+    from scipy.optimize import linear_sum_assignment
     boxes = board.find_elements([Elements.BOX.value])
     goals = board.find_elements([Elements.GOAL.value, Elements.PLAYER_ON_GOAL.value])
     assert len(boxes) == len(goals)
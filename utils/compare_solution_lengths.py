@@ -0,0 +1,22 @@
+import csv
+import argparse
+import agent.sokoban_solver as sokoban_solver
+
+# solves the levels listed in Results/<folder>solution_lengths.csv with the given engine and compares the solution lengths
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare solution lengths against the MCTS results')
+    parser.add_argument('--folder', type=str, default="Microban/", help='foldername')
+    parser.add_argument('--mode', type=str, default="astar", help='engine used')
+    parser.add_argument('--num_iters', type=int, default=100000, help='budget of the engine')
+    parser.add_argument('--weight', type=float, default=1.0, help='heuristic weight of astar')
+    args = parser.parse_args()
+
+    with open("Results/" + args.folder + "solution_lengths.csv") as f:
+        rows = list(csv.DictReader(f))
+
+    engine_options = {"weight": args.weight} if args.mode == "astar" else None
+    print(f"level_id,schoko,vanilla,{args.mode},time")
+    for row in rows:
+        solver = sokoban_solver.Solver()
+        outcome, length = solver.solve(int(row["level_id"]), args.folder, args.num_iters, 0, args.mode, engine_options=engine_options)
+        print(f"{row['level_id']},{row['schoko']},{row['vanilla']},{length if outcome == 'WIN' else ''},{solver.result.stats['time']:.2f}")
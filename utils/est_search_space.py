@@ -1,7 +1,9 @@
 import sys
 import os
 import numpy as np
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# run as a script (python utils/est_search_space.py) the packages are found from the repository root
+if not __package__:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from game.GameElements import Elements, char_to_element, element_to_char
 from scipy.special import comb
 import csv
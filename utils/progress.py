@@ -0,0 +1,88 @@
+import sys
+import time
+
+# structured progress events of a search, the search loop only compares its iteration count against next_iteration and
+# hands plain numbers to update() when it is due, formatting is left to the consumer
+# an event is a dict with at least "event" ("start", "progress" or "finish") and "elapsed" (seconds since the start), plus
+# the context given to Progress (e.g. engine, level_id, budget) and the fields of the event (e.g. iterations, nodes,
+# best_value, outcome)
+# a consumer is any callable taking an event, console, JSONLWriter and ProgressBar are provided
+class Progress():
+    def __init__(self, consumer, interval=0.5, **context):
+        self.consumer = consumer
+        # minimal time in seconds between two progress events
+        self.interval = interval
+        self.context = context
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.last_iterations = 0
+        # the search calls update() once its iteration count reaches this value
+        self.next_iteration = 0
+
+    def emit(self, event, **fields):
+        self.consumer({"event": event, "elapsed": time.perf_counter() - self.start, **self.context, **fields})
+
+    # emits a progress event if the interval passed since the last one (or none was emitted yet) and schedules the next
+    # check from the iteration rate
+    def update(self, iterations, **fields):
+        now = time.perf_counter()
+        elapsed = now - self.last
+        rate = (iterations - self.last_iterations) / elapsed if elapsed > 0 else 0
+        if elapsed >= self.interval or self.next_iteration == 0:
+            self.emit("progress", iterations=iterations, **fields)
+            self.last = now
+            self.last_iterations = iterations
+            self.next_iteration = iterations + max(1, int(rate * self.interval))
+        else:
+            # check again after the remaining time at the current rate
+            self.next_iteration = iterations + max(1, int(rate * (self.interval - elapsed)))
+
+# prints progress events as a single status line that is overwritten and the other events on a line of their own
+def console(event):
+    fields = ", ".join(f"{key} {value:.2f}" if isinstance(value, float) else f"{key} {value}"
+                       for key, value in event.items() if key not in ("event", "elapsed") and not isinstance(value, (dict, list)))
+    line = f"{event['elapsed']:7.1f}s {event['event']}: {fields}"
+    if event["event"] == "progress":
+        print(line, end="\r")
+    else:
+        print(line.ljust(76))
+
+# appends every event as a line of JSON to a file
+class JSONLWriter():
+    def __init__(self, path):
+        self.file = open(path, "a")
+
+    def __call__(self, event):
+        import json
+        self.file.write(json.dumps(event, default=str) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+# progress bar of the iterations against the budget of the search (the "budget" of the context)
+class ProgressBar():
+    def __init__(self, width=30, stream=sys.stdout):
+        self.width = width
+        self.stream = stream
+
+    def __call__(self, event):
+        if event["event"] == "finish":
+            self.stream.write(f"\n{event.get('outcome')} after {event['elapsed']:.1f}s\n")
+        elif event["event"] == "progress" and event.get("budget"):
+            done = min(event["iterations"] / event["budget"], 1)
+            filled = int(done * self.width)
+            rate = event["iterations"] / event["elapsed"] if event["elapsed"] > 0 else 0
+            self.stream.write(f"\r[{'#' * filled}{'.' * (self.width - filled)}] {done:4.0%} {event['iterations']}/{event['budget']} "
+                              f"{rate:.0f} it/s")
+        self.stream.flush()
+
+# consumer given on the command line: "console", "bar" or "jsonl:<path>"
+def get_consumer(name):
+    if name == "console":
+        return console
+    if name == "bar":
+        return ProgressBar()
+    if name.startswith("jsonl:"):
+        return JSONLWriter(name[len("jsonl:"):])
+    raise ValueError(f"unknown progress consumer {name}, use console, bar or jsonl:<path>")
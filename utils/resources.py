@@ -0,0 +1,22 @@
+import sys
+import subprocess
+
+# returns the peak resident set size of the current process in MB, None if it can't be determined on this platform
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS and in kilobytes on Linux
+    if sys.platform == "darwin":
+        return peak / 2**20
+    return peak / 2**10
+
+# short hash of the commit checked out, None outside of a git checkout, used to label benchmark results
+def git_commit():
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,107 @@
+import os
+import csv
+import time
+import random
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import agent.sokoban_solver as sokoban_solver
+from utils.suite_benchmark import throughput
+
+# adaptive budgets for a level collection: every level is first searched with a small budget, the levels that are not
+# solved are searched again in rounds with eta times the budget of the previous round, until every level is solved, the
+# largest budget is reached or the total CPU time spent exceeds the limit
+# schoko resumes the tree of the previous round from a checkpoint, so a round only pays for the additional iterations,
+# the other engines search again from the start
+# within a round the levels that were cheapest so far go first, so the levels most likely to be solved with the CPU time
+# left are tried before the limit is reached, a level whose search ended before its budget without a solution (the search
+# space is exhausted) is not tried again
+
+FIELDS = ["level_id", "engine", "outcome", "length", "budget", "rounds", "cpu_time", "time", "iterations"]
+
+def schedule_path(folder, mode, label):
+    return "Results/" + folder + f"schedule_{mode}_{label}.csv"
+
+# searches a level with the given budget, run in a worker process
+# checkpoint: file the tree of schoko is resumed from (if it exists) and saved to, None to start from nothing
+def search_level(level_id, folder, mode, budget, checkpoint, seed, engine_options):
+    random.seed(seed)
+    solver = sokoban_solver.Solver()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    options = {"resume": checkpoint, "checkpoint": checkpoint} if checkpoint is not None else {}
+    outcome, length = solver.solve(level_id, folder, budget, 0, mode, engine_options=engine_options, **options)
+    iterations, _, _, _ = throughput(solver.result.stats)
+    return {"level_id": level_id, "outcome": outcome, "length": length, "budget": budget, "iterations": iterations,
+            "cpu_time": time.process_time() - cpu_start, "time": time.perf_counter() - start}
+
+# yields the row of every level once it is final: solved, exhausted, or unsolved after the last round it took part in
+# initial: budget of the first round, eta: factor between the budgets of two rounds, max_budget: largest budget
+# cpu_limit: total CPU seconds of the searches, no new searches are started once it is spent (running ones finish)
+# workers: number of processes searching levels at the same time
+# reuse: resume the trees of schoko from checkpoints in checkpoint_dir, a temporary directory that is removed afterwards
+# if None
+def schedule(folder, level_ids, mode="schoko", initial=100, eta=4, max_budget=100000, cpu_limit=None, workers=1, seed=0,
+             engine_options=None, checkpoint_dir=None, reuse=True, verbose=0):
+    reuse = reuse and mode == "schoko"
+    temporary = checkpoint_dir is None and reuse
+    if temporary:
+        checkpoint_dir = tempfile.mkdtemp(prefix="schokoban_schedule_")
+    rows = {level_id: {"level_id": level_id, "engine": mode, "outcome": "LOSS", "length": None, "budget": 0, "rounds": 0,
+                       "cpu_time": 0.0, "time": 0.0, "iterations": None} for level_id in level_ids}
+    pending = list(level_ids)
+    spent = 0.0
+    budget = min(initial, max_budget)
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            while pending and (cpu_limit is None or spent < cpu_limit):
+                queue = sorted(pending, key=lambda level_id: rows[level_id]["cpu_time"])
+                running = {}
+                unsolved = []
+                while queue or running:
+                    while queue and len(running) < workers and (cpu_limit is None or spent < cpu_limit):
+                        level_id = queue.pop(0)
+                        checkpoint = None
+                        if reuse:
+                            checkpoint = os.path.join(checkpoint_dir, f"level_{level_id}.npz")
+                        running[pool.submit(search_level, level_id, folder, mode, budget, checkpoint, seed, engine_options)] = level_id
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        level_id = running.pop(future)
+                        result = future.result()
+                        row = rows[level_id]
+                        spent += result["cpu_time"]
+                        row.update(outcome=result["outcome"], length=result["length"], budget=budget, rounds=row["rounds"] + 1,
+                                   cpu_time=row["cpu_time"] + result["cpu_time"], time=row["time"] + result["time"],
+                                   iterations=result["iterations"])
+                        exhausted = result["iterations"] is not None and result["iterations"] < budget
+                        if result["outcome"] == "WIN" or exhausted:
+                            yield row
+                        else:
+                            unsolved.append(level_id)
+                # levels left in the queue when the CPU time ran out stay unsolved
+                pending = unsolved + queue
+                if verbose:
+                    solved = sum(row["outcome"] == "WIN" for row in rows.values())
+                    print(f"Budget {budget}: {solved} solved, {len(pending)} unsolved, {spent:.1f} CPU seconds spent.")
+                # the last round runs with max_budget even if it is not a power of eta times the initial budget
+                if budget >= max_budget:
+                    break
+                budget = min(budget * eta, max_budget)
+    finally:
+        if temporary:
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    for level_id in pending:
+        yield rows[level_id]
+
+def write_rows(path, rows):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in sorted(rows, key=lambda row: row["level_id"]):
+            writer.writerow({field: "" if row[field] is None else row[field] for field in FIELDS})
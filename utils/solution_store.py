@@ -0,0 +1,93 @@
+import json
+import time
+import sqlite3
+import hashlib
+
+import os
+from game.GameElements import Elements
+from game.encoding import StateEncoder
+
+# persistent store of the best known solution of every level, an SQLite database keyed by a hash of the level content
+# (walls and goals) and a hash of the start state (player area and boxes), so renumbered or copied levels are found again
+# and a changed level file is not matched by its old solutions
+# the solver looks a level up before searching (see agent.sokoban_solver) and records every solution it finds, only
+# shorter solutions replace a stored one
+
+DEFAULT_PATH = "Results/solutions.sqlite"
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS solutions (
+    level_hash TEXT NOT NULL,
+    state_hash TEXT NOT NULL,
+    folder TEXT,
+    level_id INTEGER,
+    length INTEGER NOT NULL,
+    moves TEXT NOT NULL,
+    engine TEXT,
+    stats TEXT,
+    updated REAL,
+    PRIMARY KEY (level_hash, state_hash)
+)"""
+
+# hash of the static part of a level: the walls and goals, boxes and the player are replaced by the square below them
+def level_hash(board):
+    level = board.level.copy()
+    level[level == Elements.BOX.value] = Elements.FLOOR.value
+    level[level == Elements.PLAYER.value] = Elements.FLOOR.value
+    level[level == Elements.BOX_ON_GOAL.value] = Elements.GOAL.value
+    level[level == Elements.PLAYER_ON_GOAL.value] = Elements.GOAL.value
+    return hashlib.sha1(str(level.shape).encode() + level.astype("int8").tobytes()).hexdigest()
+
+# hash of a state, the square indices of the player area and the boxes (see game.encoding), the Zobrist keys of
+# game.zobrist are not used as they are drawn from numpy's random generator, which may change between numpy versions
+def state_hash(board):
+    row = StateEncoder(board).encode(board)
+    return hashlib.sha1(",".join(str(int(i)) for i in row).encode()).hexdigest()
+
+# numpy scalars and arrays in the statistics of an engine as plain numbers and lists, also used for the JSON results of
+# agent.batch and agent.service
+def to_json(value):
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+class SolutionStore():
+    def __init__(self, path=DEFAULT_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # several processes (e.g. the workers of agent.batch) may write to the same store
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+
+    # returns the stored moves and statistics of the board, None if no solution is known
+    def lookup(self, board):
+        row = self.connection.execute("SELECT moves, engine, stats FROM solutions WHERE level_hash = ? AND state_hash = ?",
+                                      (level_hash(board), state_hash(board))).fetchone()
+        if row is None:
+            return None
+        moves, engine, stats = row
+        return [tuple(move) for move in json.loads(moves)], dict(json.loads(stats or "{}"), engine=engine)
+
+    # stores a solution of the board unless a solution with at most as many pushes is stored already
+    # returns True if the solution was stored
+    def record(self, board, moves, stats=None):
+        stats = stats or {}
+        cursor = self.connection.execute(
+            "INSERT INTO solutions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (level_hash, state_hash) DO UPDATE SET "
+            "folder = excluded.folder, level_id = excluded.level_id, length = excluded.length, moves = excluded.moves, "
+            "engine = excluded.engine, stats = excluded.stats, updated = excluded.updated WHERE excluded.length < solutions.length",
+            (level_hash(board), state_hash(board), board.folder, board.level_id, len(moves),
+             json.dumps([[int(x) for x in move] for move in moves]), stats.get("engine"), json.dumps(stats, default=to_json),
+             time.time()))
+        self.connection.commit()
+        return cursor.rowcount > 0
+
+    # removes the solution of the board, e.g. if it turned out to be invalid
+    def discard(self, board):
+        self.connection.execute("DELETE FROM solutions WHERE level_hash = ? AND state_hash = ?", (level_hash(board), state_hash(board)))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,129 @@
+import csv
+import time
+import random
+import argparse
+import statistics
+import multiprocessing as mp
+
+import os
+import agent.sokoban_solver as sokoban_solver
+from utils.resources import peak_rss, git_commit
+
+# end-to-end benchmark of a level collection: every level is solved with a fixed budget in a fresh process (so the peak
+# RSS is the one of the level) and the throughput of the engine is recorded
+# the rows are written as CSV next to Results/<folder>solution_lengths.csv, two such files (e.g. of two commits or two
+# configurations of the same engine) are compared by running this module
+
+FIELDS = ["level_id", "engine", "budget", "outcome", "length", "time", "iterations", "iterations_per_sec", "nodes_created",
+          "generated", "nodes_pruned", "peak_rss_mb", "label"]
+
+# default file of a run, the label (the commit by default) tells runs of the same engine and budget apart
+def benchmark_path(folder, mode, budget, label):
+    return "Results/" + folder + f"benchmark_{mode}_{budget}_{label}.csv"
+
+# iterations, created nodes, generated children and pruned nodes from the statistics of an engine (see agent.engine), None
+# if not reported
+# MCTS engines count iterations and tree nodes, the nodes created are the ones added to the tree (nodes and deleted nodes)
+# and the generated children include the transpositions, the searches expanded and generated states and create every
+# state they generate
+def throughput(stats):
+    iterations = stats.get("iterations", stats.get("expanded", stats.get("states")))
+    generated = stats.get("generated")
+    created = stats.get("created")
+    pruned = stats.get("pruned", stats.get("deleted_nodes"))
+    if created is None and "nodes" in stats:
+        created = stats["nodes"] + stats.get("deleted_nodes", 0)
+    if created is None:
+        created = generated
+    return iterations, created, generated, pruned
+
+# solves one level, run in a worker process of its own
+def benchmark_level(level_id, folder, mode, budget, seed, engine_options, label):
+    random.seed(seed)
+    # the heuristics import scipy on their first call (see reward_functions.min_cost_matching), it is imported here so
+    # the first search does not pay for it
+    import scipy.optimize
+    solver = sokoban_solver.Solver()
+    start = time.perf_counter()
+    outcome, length = solver.solve(level_id, folder, budget, 0, mode, engine_options=engine_options)
+    # the time of the engine itself, the wall time of solve() includes loading the level and its deadlocks and the first
+    # imports of the heuristics, which dominate short runs
+    elapsed = solver.result.stats.get("time", time.perf_counter() - start)
+    iterations, created, generated, pruned = throughput(solver.result.stats)
+    return {"level_id": level_id, "engine": mode, "budget": budget, "outcome": outcome, "length": length, "time": elapsed,
+            "iterations": iterations, "iterations_per_sec": iterations / elapsed if iterations is not None and elapsed > 0 else None,
+            "nodes_created": created, "generated": generated, "nodes_pruned": pruned, "peak_rss_mb": peak_rss(), "label": label}
+
+# benchmarks the given levels one after the other, yields a row per level as soon as it is done
+def run_suite(folder, level_ids, mode, budget, seed=0, engine_options=None, label=None):
+    label = label or git_commit() or "local"
+    # a new process per level, the peak RSS of a process never decreases
+    with mp.Pool(1, maxtasksperchild=1) as pool:
+        for level_id in level_ids:
+            yield pool.apply(benchmark_level, (level_id, folder, mode, budget, seed, engine_options, label))
+
+def write_rows(path, rows):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: "" if row[field] is None else row[field] for field in FIELDS})
+
+def read_rows(path):
+    with open(path) as f:
+        return {int(row["level_id"]): row for row in csv.DictReader(f)}
+
+def number(value):
+    return float(value) if value not in (None, "") else None
+
+# prints a comparison of two runs: solved levels, time and throughput on the levels both runs contain and the levels whose
+# outcome or time changed by more than threshold
+def compare(baseline, current, threshold=0.2):
+    levels = sorted(set(baseline) & set(current))
+    solved = lambda rows: [level for level in levels if rows[level]["outcome"] == "WIN"]
+    before, after = solved(baseline), solved(current)
+    print(f"levels: {len(levels)}, solved: {len(before)} -> {len(after)}")
+    gained = sorted(set(after) - set(before))
+    lost = sorted(set(before) - set(after))
+    if gained:
+        print(f"newly solved: {', '.join(str(level) for level in gained)}")
+    if lost:
+        print(f"no longer solved: {', '.join(str(level) for level in lost)}")
+
+    for field, unit in [("time", "s"), ("peak_rss_mb", " MB")]:
+        old = [number(baseline[level][field]) for level in levels]
+        new = [number(current[level][field]) for level in levels]
+        if None in old or None in new:
+            continue
+        print(f"{field}: total {sum(old):.1f}{unit} -> {sum(new):.1f}{unit}, max {max(old):.1f}{unit} -> {max(new):.1f}{unit}")
+    rates = [(number(baseline[level]["iterations_per_sec"]), number(current[level]["iterations_per_sec"])) for level in levels]
+    ratios = [new / old for old, new in rates if old and new]
+    if ratios:
+        print(f"iterations/sec: median ratio {statistics.median(ratios):.2f} over {len(ratios)} levels")
+    both = [level for level in before if level in after]
+    lengths = [(number(baseline[level]["length"]), number(current[level]["length"])) for level in both]
+    if lengths:
+        print(f"solution length on the {len(both)} levels solved by both: {sum(old for old, _ in lengths):.0f} -> "
+              f"{sum(new for _, new in lengths):.0f}")
+
+    print(f"{'level':>5} {'outcome':>13} {'time':>17} {'iter/sec':>19}")
+    for level in levels:
+        old, new = baseline[level], current[level]
+        old_time, new_time = number(old["time"]), number(new["time"])
+        changed = old["outcome"] != new["outcome"] or (old_time and new_time and abs(new_time / old_time - 1) > threshold)
+        if not changed:
+            continue
+        rate = lambda row: f"{number(row['iterations_per_sec']):.0f}" if number(row["iterations_per_sec"]) is not None else "-"
+        times = f"{old_time:.2f}s->{new_time:.2f}s"
+        print(f"{level:>5} {old['outcome']:>6}->{new['outcome']:<6} {times:>17} {rate(old):>9}->{rate(new):<9}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare two end-to-end benchmark runs of a level collection')
+    parser.add_argument('baseline', type=str, help='CSV written by solve_levels.py --benchmark')
+    parser.add_argument('current', type=str, help='CSV compared against the baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative change of the time listed per level')
+    args = parser.parse_args()
+    compare(read_rows(args.baseline), read_rows(args.current), args.threshold)